@@ -2,16 +2,22 @@ import os
 import io
 import sys
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
-from docx import Document
-from fpdf import FPDF
+from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal
 import fitz  # PyMuPDF
 from PIL import Image
+from telemetry import trace_span, record_llm_usage, start_metrics_server
+from llm_gateway import create_gateway
+from intent_classifier import IntentClassifier
+from draft_export import make_draft_artifact
+from retrieval_client import RemoteRetriever, RemoteEmbeddings
+from page_store import locate_excerpt
+from citation_index import CitationIndex
+from context_compression import compress_context
+from index_artifacts import ensure_index
 
 # 1. SETUP
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -20,203 +26,286 @@ sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DB_PATH = "vector_db"
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")  # "fake" runs offline (tests, load runs)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "quantized" = int8 memory-mapped store (quantized_store.py)
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL")  # Set when retrieval_service.py runs on this box
+CITED_DENSE_K = 2  # Dense chunks kept next to exact provisions when the query cites them
+METRICS_PORT = os.getenv("METRICS_PORT")  # e.g. 9108 to expose /metrics for Prometheus
+INDEX_ARTIFACT_URL = os.getenv("INDEX_ARTIFACT_URL")  # latest.json or .tar.gz published by index_artifacts.py
 
-if not GROQ_API_KEY:
+if LLM_BACKEND == "groq" and not GROQ_API_KEY:
     raise ValueError("❌ API Key missing!")
 
 # 2. RESOURCES
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-vector_db = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-retriever = vector_db.as_retriever(search_kwargs={"k": 5})
+if not RETRIEVAL_SERVICE_URL:
+    ensure_index(INDEX_ARTIFACT_URL)  # Replica: install the published index unless already on it, never re-ingest
 
-llm = ChatGroq(temperature=0.1, model_name="llama-3.3-70b-versatile", api_key=GROQ_API_KEY)
+if RETRIEVAL_SERVICE_URL:
+    # Shared service owns the model and index; this worker holds no ML state
+    embeddings = RemoteEmbeddings(RETRIEVAL_SERVICE_URL)
+    retriever = RemoteRetriever(url=RETRIEVAL_SERVICE_URL, k=5)
+elif VECTOR_BACKEND == "quantized":
+    from embedding_backends import get_embeddings
+    from quantized_store import QuantizedStore, QuantizedRetriever
+    embeddings = get_embeddings()
+    retriever = QuantizedRetriever(store=QuantizedStore(), embeddings=embeddings, k=5)
+else:
+    from langchain_chroma import Chroma
+    from embedding_backends import get_embeddings
+    embeddings = get_embeddings()  # EMBEDDING_BACKEND=torch|onnx|onnx-int8, EMBEDDING_THREADS=N
+    from index_maintenance import collection_metadata
+    vector_db = Chroma(persist_directory=DB_PATH, embedding_function=embeddings, collection_metadata=collection_metadata(DB_PATH))
+    retriever = vector_db.as_retriever(search_kwargs={"k": 5})
+intent_classifier = IntentClassifier(embeddings)
+citation_index = CitationIndex()
+
+# All chains go through the gateway (concurrency, rate limits, retries, per-user accounting)
+gateway = create_gateway(LLM_BACKEND, api_key=GROQ_API_KEY)
+llm = gateway.as_runnable()
+
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
 
 # --- HELPER FUNCTIONS ---
-def generate_docx(text):
-    doc = Document()
-    doc.add_heading('JurisOne Legal Draft', 0)
-    for paragraph in text.split('\n'):
-        if paragraph.strip():
-            doc.add_paragraph(paragraph.strip())
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
-
-def generate_pdf(text):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=11)
-    clean_text = text.encode('latin-1', 'replace').decode('latin-1')
-    pdf.multi_cell(0, 8, clean_text)
-    buffer = io.BytesIO()
-    pdf_output = pdf.output(dest='S').encode('latin-1')
-    buffer.write(pdf_output)
-    buffer.seek(0)
-    return buffer
-
-def get_source_image(file_path, page_number):
-    try:
-        clean_path = file_path.replace("\\", "/")
-        filename = os.path.basename(clean_path)
-        local_path = os.path.join("source_docs", filename)
-        if not os.path.exists(local_path): return None
-        doc = fitz.open(local_path)
-        if page_number >= len(doc): return None
-        page = doc.load_page(page_number)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        return img
-    except: return None
+def get_source_image(file_path, page_number, excerpt=None):
+    """Render a source page, highlighting the cited excerpt when it can be found on the page."""
+    with trace_span("source_image", page=page_number) as span:
+        try:
+            clean_path = file_path.replace("\\", "/")
+            filename = os.path.basename(clean_path)
+            local_path = os.path.join("source_docs", filename)
+            if not os.path.exists(local_path): return None
+            if excerpt:
+                page_number = locate_excerpt(local_path, page_number, excerpt)
+            with fitz.open(local_path) as doc:
+                if page_number >= len(doc): return None
+                page = doc.load_page(page_number)
+                if excerpt:
+                    span.set(highlights=highlight_excerpt(page, excerpt))
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                return img
+        except:
+            span.status = "error"  # Swallowed, so trace_span won't mark it; count it in stage errors
+            span.set(error="render_failed")
+            return None
+
+def highlight_excerpt(page, excerpt, max_lines=8):
+    """Add highlight annotations over the excerpt's lines (in memory only). Returns the hit count."""
+    hits = 0
+    lines = [line.strip() for line in excerpt.split("\n") if len(line.strip()) >= 12]
+    for line in lines[:max_lines]:
+        quads = page.search_for(line, quads=True)
+        if quads:
+            page.add_highlight_annot(quads)
+            hits += len(quads)
+    return hits
+
+def invoke_llm(stage, prompt, inputs):
+    """Run `prompt | llm` inside a span and record token usage. Returns the AIMessage."""
+    with trace_span(stage) as span:
+        message = (prompt | llm).invoke(inputs)
+        record_llm_usage(span, message)
+        gateway_info = message.response_metadata.get("gateway", {})
+        span.set(retries=gateway_info.get("retries", 0), hedged=gateway_info.get("hedged", False))
+        return message
 
 # --- INTELLIGENCE FUNCTIONS ---
 
 # 1. THE STRATEGIST (Research with Memory)
+# This fixes the "Deaf Bot" issue. We tell it: "Look at the history!"
+QUERY_TRANSFORM_PROMPT = ChatPromptTemplate.from_template(
+    """
+    Given the conversation history and the new question, create a precise search query.
+
+    HISTORY: {history}
+    NEW QUESTION: {question}
+
+    If the question is "What documents do I need?", and history is about "Attempted Murder", 
+    the search query must be: "Documents required for Attempted Murder case India".
+
+    OUTPUT ONLY THE SEARCH QUERY.
+    """
+)
+
+ANSWER_PROMPT = ChatPromptTemplate.from_template(
+    """
+    You are a Senior Legal Partner. Provide strategic advice.
+
+    CONTEXT (Laws/Judgments): {context}
+    USER QUERY: {question}
+
+    **INSTRUCTIONS:**
+    1. Answer based on the CONTEXT provided.
+    2. If the user asks for documents, list them clearly.
+    3. END your response by saying: 
+       "I can draft these for you. Just say: 'Draft the [Document Name]'."
+
+    **FORMAT:**
+    - **Executive Summary**
+    - **Legal Provisions** (Cite Sections)
+    - **Precedents** (Cite Case Names if in context)
+    - **Strategic Steps**
+    """
+)
+
+def rewrite_search_query(query, history_text):
+    message = invoke_llm("query_rewrite", QUERY_TRANSFORM_PROMPT, {"history": history_text, "question": query})
+    return StrOutputParser().invoke(message)
+
+def answer_from_context(query, context):
+    with trace_span("context_compression", chunks=len(context)) as span:
+        compressed = compress_context(query, context, embeddings)
+        span.set(input_chars=sum(len(d.page_content) for d in context), output_chars=len(compressed))
+    message = invoke_llm("answer", ANSWER_PROMPT, {"context": compressed, "question": query})
+    return StrOutputParser().invoke(message)
+
+def retrieve_batch(search_queries):
+    """Top-5 chunks for many queries, embedding them all in one call where the backend allows it."""
+    with trace_span("retrieval_batch", queries=len(search_queries)) as span:
+        if RETRIEVAL_SERVICE_URL:
+            results = retriever.batch(search_queries)  # The service micro-batches these itself
+        else:
+            vectors = embeddings.embed_documents(search_queries)
+            if VECTOR_BACKEND == "quantized":
+                results = [retriever.store.search(v, k=retriever.k) for v in vectors]
+            else:
+                results = [vector_db.similarity_search_by_vector(v, k=5) for v in vectors]
+        span.set(chunks=sum(len(r) for r in results))
+    return results
+
 def get_research_response(query, history_text):
     """
     Research that remembers context. 
     It combines history + new query to find the right documents.
     """
-    
-    # STEP A: CONTEXTUAL SEARCH QUERY
-    # This fixes the "Deaf Bot" issue. We tell it: "Look at the history!"
-    query_transform_prompt = ChatPromptTemplate.from_template(
-        """
-        Given the conversation history and the new question, create a precise search query.
-        
-        HISTORY: {history}
-        NEW QUESTION: {question}
-        
-        If the question is "What documents do I need?", and history is about "Attempted Murder", 
-        the search query must be: "Documents required for Attempted Murder case India".
-        
-        OUTPUT ONLY THE SEARCH QUERY.
-        """
-    )
-    
-    # Create the search query
-    search_query_chain = query_transform_prompt | llm | StrOutputParser()
-    generated_query = search_query_chain.invoke({"history": history_text, "question": query})
-    print(f"DEBUG: Generated Search Query: {generated_query}") # See this in terminal
+    # FAST PATH: explicit citations ("Section 103 BNS", "Article 21") resolve exactly, no rewrite needed
+    with trace_span("citation_lookup") as span:
+        cited = citation_index.documents_for(query)
+        span.set(chunks=len(cited), cache_hit=bool(cited))
+
+    if cited:
+        with trace_span("retrieval", search_query=query) as span:
+            context = cited + retriever.invoke(query)[:CITED_DENSE_K]
+            span.set(chunks=len(context))
+    else:
+        # STEP A: CONTEXTUAL SEARCH QUERY
+        generated_query = rewrite_search_query(query, history_text)
+
+        with trace_span("retrieval", search_query=generated_query) as span:
+            context = retriever.invoke(generated_query) # Use the SMART query
+            span.set(chunks=len(context))
 
     # STEP B: SENIOR PARTNER ANSWER
-    answer_prompt = ChatPromptTemplate.from_template(
-        """
-        You are a Senior Legal Partner. Provide strategic advice.
-        
-        CONTEXT (Laws/Judgments): {context}
-        USER QUERY: {question}
-        
-        **INSTRUCTIONS:**
-        1. Answer based on the CONTEXT provided.
-        2. If the user asks for documents, list them clearly.
-        3. END your response by saying: 
-           "I can draft these for you. Just say: 'Draft the [Document Name]'."
-        
-        **FORMAT:**
-        - **Executive Summary**
-        - **Legal Provisions** (Cite Sections)
-        - **Precedents** (Cite Case Names if in context)
-        - **Strategic Steps**
-        """
-    )
-    
-    rag_chain = (
-        RunnableParallel({
-            "context": lambda x: retriever.invoke(generated_query), # Use the SMART query
-            "question": RunnablePassthrough()
-        })
-        .assign(answer= answer_prompt | llm | StrOutputParser())
-    )
-    
-    return rag_chain.invoke(query)
 
-# 2. THE INTERVIEWER (Context Aware)
-def analyze_drafting_needs(user_input, history_text):
-    analyzer_prompt = ChatPromptTemplate.from_template(
+    return {"context": context, "question": query, "answer": answer_from_context(query, context)}
+
+# 2. THE DRAFTER (Interviews first if details are missing)
+class DraftResult(BaseModel):
+    status: Literal["READY", "MISSING_INFO"] = Field(description="READY if the history has enough names/dates/details to draft")
+    missing_details: List[str] = Field(default_factory=list, description="Questions to ask the user when status is MISSING_INFO")
+    document_type: str = Field(description="Specific Document Name (e.g. Bail Application for Attempted Murder)")
+    draft: str = Field(default="", description="The full document text when status is READY, otherwise empty")
+
+    @model_validator(mode="after")
+    def check_status_payload(self):
+        if self.status == "READY" and not self.draft.strip():
+            raise ValueError("status READY requires a non-empty draft")
+        if self.status == "MISSING_INFO" and not self.missing_details:
+            raise ValueError("status MISSING_INFO requires missing_details")
+        return self
+
+def generate_legal_draft(user_input, history_text):
+    """One LLM call that both checks for missing details and drafts the document. Returns a validated DraftResult."""
+    draft_parser = PydanticOutputParser(pydantic_object=DraftResult)
+    draft_prompt = ChatPromptTemplate.from_template(
         """
-        You are a Legal Drafting Expert.
+        You are a Senior Advocate and Legal Drafting Expert.
         Analyze the HISTORY to understand what case we are dealing with.
-        
+
         Current Request: {input}
         Full Conversation History: {history}
-        
+
         **TASK:**
         1. Extract the Case Type from history (e.g., Hit and Run, Murder, Rent).
         2. Identify the document the user wants to draft now.
-        3. Check if we have names/dates/details.
-        
-        **OUTPUT JSON ONLY:**
-        {{
-            "status": "READY" or "MISSING_INFO",
-            "missing_details": ["List of questions"],
-            "document_type": "Specific Document Name (e.g. Bail Application for Attempted Murder)"
-        }}
-        """
-    )
-    chain = analyzer_prompt | llm | JsonOutputParser()
-    return chain.invoke({"input": user_input, "history": history_text})
+        3. Check if we have names/dates/details. If essential details are missing, set status to
+           MISSING_INFO, list the questions and leave "draft" empty.
+        4. Otherwise set status to READY and put the professional draft in "draft":
+           - Full Legal Format.
+           - Use placeholders [_______] for minor missing info.
+           - NO conversational text. Just the document content.
 
-# 3. THE DRAFTER
-def generate_legal_draft(user_input, history_text, doc_type):
-    draft_prompt = ChatPromptTemplate.from_template(
-        """
-        You are a Senior Advocate. Draft a professional **{doc_type}**.
-        Use the details from this history:
-        {history}
-        
-        Requirements:
-        - Full Legal Format.
-        - Use placeholders [_______] for missing info.
-        - NO conversational text. Just the document content.
+        **OUTPUT JSON ONLY:**
+        {format_instructions}
         """
-    )
-    chain = draft_prompt | llm | StrOutputParser()
-    return chain.invoke({"history": history_text, "input": user_input, "doc_type": doc_type})
+    ).partial(format_instructions=draft_parser.get_format_instructions())
+    message = invoke_llm("generate_legal_draft", draft_prompt, {"input": user_input, "history": history_text})
+    return draft_parser.invoke(message)
 
-def convert_law_code(query):
+def convert_law_code(query, user=None):
     converter_prompt = ChatPromptTemplate.from_template(
         "Map Old IPC '{query}' to New BNS. Output: Old -> New (Key Changes)."
     )
-    chain = converter_prompt | llm | StrOutputParser()
-    return chain.invoke({"query": query})
+    with gateway.user_context(user):
+        message = invoke_llm("convert_law_code", converter_prompt, {"query": query})
+    return StrOutputParser().invoke(message)
 
 # --- MAIN ROUTER ---
-def ask_legal_ai(user_input, chat_history_list):
-    # 1. Format History
-    history_text = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in chat_history_list])
-    
-    # 2. TRIGGER LOGIC (Expanded Keywords)
-    # This fixes the "draft the" issue
-    draft_keywords = ["draft", "write", "prepare", "create", "generate"]
-    is_draft_request = any(k in user_input.lower() for k in draft_keywords)
-    
-    # 3. ROUTING
-    if is_draft_request:
-        analysis = analyze_drafting_needs(user_input, history_text)
-        
-        if analysis["status"] == "MISSING_INFO":
-            questions = "\n".join([f"- {q}" for q in analysis["missing_details"]])
+def ask_legal_ai(user_input, chat_history_list, user=None):
+    with trace_span("ask_legal_ai", history_messages=len(chat_history_list)) as turn, gateway.user_context(user):
+        # 1. Format History
+        history_text = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in chat_history_list])
+
+        # 2. INTENT (Local embedding classifier, no LLM round-trip)
+        with trace_span("intent_routing") as span:
+            intent, confidence = intent_classifier.classify(user_input)
+            span.set(intent=intent, confidence=round(confidence, 3))
+
+        # 3. ROUTING
+        if intent == "draft":
+            try:
+                analysis = generate_legal_draft(user_input, history_text)
+            except OutputParserException as e:
+                # Off-schema reply (bad status, missing fields, empty draft): never show a broken draft
+                turn.set(route="draft_invalid", error=str(e)[:200])
+                return {
+                    "type": "interview",
+                    "answer": "**Drafting Protocol**\n\nI couldn't produce a complete draft from that. Please restate the document you need with the parties, dates and key facts.",
+                    "context": []
+                }
+
+            if analysis.status == "MISSING_INFO":
+                turn.set(route="interview")
+                questions = "\n".join([f"- {q}" for q in analysis.missing_details])
+                return {
+                    "type": "interview",
+                    "answer": f"**Drafting Protocol: {analysis.document_type}**\n\nI have the legal context, but I need specific details to fill the document:\n\n{questions}",
+                    "context": []
+                }
+            else:
+                turn.set(route="draft")
+                return {
+                    "type": "draft",
+                    "answer": f"**Draft Ready: {analysis.document_type}**\n\nHere is the legally compliant draft based on our case strategy.",
+                    "draft": make_draft_artifact(analysis.document_type, analysis.draft),
+                    "context": []
+                }
+
+        elif intent == "convert":
+            turn.set(route="convert")
             return {
-                "type": "interview",
-                "answer": f"**Drafting Protocol: {analysis['document_type']}**\n\nI have the legal context, but I need specific details to fill the document:\n\n{questions}",
+                "type": "convert",
+                "answer": convert_law_code(user_input, user=user),
                 "context": []
             }
+
         else:
-            draft_text = generate_legal_draft(user_input, history_text, analysis["document_type"])
+            # Research Mode (Now passes HISTORY_TEXT)
+            turn.set(route="research")
+            response = get_research_response(user_input, history_text)
             return {
-                "type": "draft",
-                "answer": f"**Draft Ready: {analysis['document_type']}**\n\nHere is the legally compliant draft based on our case strategy.",
-                "docx": generate_docx(draft_text),
-                "pdf": generate_pdf(draft_text),
-                "context": []
+                "type": "research",
+                "answer": response["answer"],
+                "context": response["context"]
             }
-            
-    else:
-        # Research Mode (Now passes HISTORY_TEXT)
-        response = get_research_response(user_input, history_text)
-        return {
-            "type": "research",
-            "answer": response["answer"],
-            "context": response["context"]
-        }
\ No newline at end of file
@@ -1,10 +1,15 @@
 import streamlit as st
 import os
 import json
-from app_logic import ask_legal_ai, convert_law_code, get_source_image
+import streamlit.components.v1 as components
+from app_logic import ask_legal_ai, convert_law_code, get_source_image, gateway
+from telemetry import stage_summary, read_trace_file
+from draft_export import is_cached, get_export, submit_export
+from case_search import index_message, sync_user, search
 
 # --- CONFIGURATION & DATABASE SETUP ---
 DB_FILE = "jurisone_data.json"
+ADMIN_USERS = [u.strip() for u in os.getenv("JURISONE_ADMINS", "").split(",") if u.strip()]
 
 def load_db():
     """Load users and chats from local JSON file."""
@@ -21,6 +26,63 @@ def save_db(data):
     with open(DB_FILE, "w") as f:
         json.dump(data, f, indent=4)
 
+def show_draft_exports(draft, message_index):
+    """Download buttons for a stored draft. Files render on the export pool when first requested."""
+    labels = {"docx": "📄 Download DOCX", "pdf": "📑 Download PDF"}
+    cols = st.columns(len(labels))
+    for col, (fmt, label) in zip(cols, labels.items()):
+        with col:
+            # Identical drafts can appear in several messages, so keys include the message index
+            state_key = f"export_{message_index}_{draft['id']}_{fmt}"
+            pending_key = f"pending_{state_key}"
+            if state_key not in st.session_state and pending_key not in st.session_state and is_cached(draft["text"], fmt):
+                st.session_state[state_key] = get_export(draft["text"], fmt)  # Cache hit: a file read
+
+            if state_key in st.session_state:
+                st.download_button(label, st.session_state[state_key], f"draft_{draft['id']}.{fmt}", key=f"dl_{state_key}")
+            elif pending_key in st.session_state:
+                poll_export(pending_key, state_key)
+            elif st.button(f"Prepare {fmt.upper()}", key=f"prep_{state_key}"):
+                st.session_state[pending_key] = submit_export(draft["text"], fmt)
+                st.rerun()
+
+@st.fragment(run_every=1)
+def poll_export(pending_key, state_key):
+    """Re-runs on its own every second until the background render finishes, then refreshes the page."""
+    future = st.session_state[pending_key]
+    if future.done():
+        del st.session_state[pending_key]
+        if future.exception():
+            st.error(f"Export failed: {future.exception()}")
+            return
+        st.session_state[state_key] = future.result()
+        st.rerun()
+    st.caption("⏳ Rendering...")
+
+def show_case_search(user):
+    """Sidebar search over the user's own messages and drafts. A hit opens its case at that message."""
+    query = st.text_input("🔎 Search case files", placeholder="e.g. Arnesh Kumar guidelines")
+    if not query:
+        return
+    hits = search(user, query)
+    if not hits:
+        st.caption("No matches.")
+    for i, hit in enumerate(hits):
+        who = "You" if hit["role"] == "user" else "JurisOne"
+        st.markdown(f"**{hit['case_id']}** · {who}  \n{hit['snippet']}")
+        if st.button("Open", key=f"search_hit_{i}"):
+            st.session_state.current_chat_id = hit["case_id"]
+            st.session_state.jump_to_message = hit["msg_index"]
+            st.rerun()
+
+def scroll_to_message(msg_index):
+    """Scroll the chat to the anchor rendered before message `msg_index`."""
+    components.html(
+        f"<script>const el = window.parent.document.getElementById('msg-{msg_index}');"
+        f"if (el) el.scrollIntoView({{behavior: 'smooth', block: 'start'}});</script>",
+        height=0,
+    )
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="JurisOne | Legal Intelligence",
@@ -91,6 +153,7 @@ def main_app():
         
     user_data = db[user]
     chats = user_data["chats"]
+    sync_user(user, chats)  # Cheap count check; rebuilds the search index if it is missing
     
     # --- SIDEBAR: WORKSPACE ---
     with st.sidebar:
@@ -128,13 +191,27 @@ def main_app():
             st.session_state.current_chat_id = selected_case
             st.rerun()
             
+        show_case_search(user)
+
         st.markdown("---")
         st.subheader("🛠️ Tools")
         ipc_input = st.text_input("IPC -> BNS Converter", placeholder="e.g. 302 IPC")
         if st.button("Convert"):
-             res = convert_law_code(ipc_input)
+             res = convert_law_code(ipc_input, user=user)
              st.info(res)
 
+        # 3. Admin Panel (latency per pipeline stage, across all workers)
+        if user in ADMIN_USERS:
+            st.markdown("---")
+            with st.expander("📊 Pipeline Metrics"):
+                summary = stage_summary(read_trace_file())
+                if summary:
+                    st.dataframe(summary, use_container_width=True, hide_index=True)
+                else:
+                    st.caption("No traces recorded yet.")
+                st.caption("LLM usage per user (this worker)")
+                st.dataframe(gateway.usage_report(), use_container_width=True, hide_index=True)
+
     # --- MAIN CHAT AREA ---
     st.markdown('<div class="main-header">JurisOne ⚖️</div>', unsafe_allow_html=True)
     st.markdown(f'<div class="sub-header">AI Co-Counsel • Working on: <b>{st.session_state.current_chat_id}</b></div>', unsafe_allow_html=True)
@@ -144,10 +221,16 @@ def main_app():
     history = chats[current_chat_id]
 
     # 2. Display Chat
-    for message in history:
+    for i, message in enumerate(history):
+        st.markdown(f'<div id="msg-{i}"></div>', unsafe_allow_html=True)
         avatar = "🧑‍⚖️" if message["role"] == "user" else "🤖"
         with st.chat_message(message["role"], avatar=avatar):
             st.markdown(message["content"])
+            if message.get("draft"):
+                show_draft_exports(message["draft"], i)
+
+    if "jump_to_message" in st.session_state:
+        scroll_to_message(st.session_state.pop("jump_to_message"))
 
     # 3. Handle Input
     if prompt := st.chat_input("Draft a petition, research case law..."):
@@ -160,27 +243,31 @@ def main_app():
         history.append({"role": "user", "content": prompt})
         db[user]["chats"][current_chat_id] = history
         save_db(db) 
+        index_message(user, current_chat_id, len(history) - 1, history[-1])
         
         # C. Generate AI Response
         with st.chat_message("assistant", avatar="🤖"):
             message_placeholder = st.empty()
             with st.spinner("⚖️ Consulting database..."):
                 try:
-                    response_data = ask_legal_ai(prompt, history)
+                    response_data = ask_legal_ai(prompt, history, user=user)
                     final_answer = response_data["answer"]
                     
                     message_placeholder.markdown(final_answer)
                     
-                    # D. Save AI Msg
-                    history.append({"role": "assistant", "content": final_answer})
+                    # D. Save AI Msg (drafts are stored on the message so they survive reruns)
+                    ai_message = {"role": "assistant", "content": final_answer}
+                    if response_data.get("draft"):
+                        ai_message["draft"] = response_data["draft"]
+                    history.append(ai_message)
                     db[user]["chats"][current_chat_id] = history
                     save_db(db)
+                    index_message(user, current_chat_id, len(history) - 1, ai_message)
                     
                     # E. SHOW EXTRAS (RESTORED IMAGES!)
                     if response_data.get("type") == "draft":
                         st.success("Draft Generated.")
-                        st.download_button("📄 Download DOCX", response_data["docx"], "draft.docx")
-                        st.download_button("📑 Download PDF", response_data["pdf"], "draft.pdf")
+                        show_draft_exports(response_data["draft"], len(history) - 1)
                     
                     # --- FIXED VERIFICATION DECK ---
                     elif response_data.get("type") == "research" and response_data.get("context"):
@@ -207,7 +294,7 @@ def main_app():
                                  # Right: The Actual Image
                                  with col2:
                                      # Call the image generator from app_logic
-                                     img = get_source_image(source_path, page_num)
+                                     img = get_source_image(source_path, page_num, excerpt=doc.page_content)
                                      if img:
                                          st.image(img, caption=f"Original Scan: Page {page_num + 1}", use_container_width=True)
                                      else:
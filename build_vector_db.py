@@ -1,7 +1,8 @@
 import os
 from langchain_community.document_loaders import CSVLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from embedding_backends import get_embeddings
+from index_maintenance import collection_metadata
 
 DATA_PATH = "data/bns_cleaned.csv"
 DB_PATH = "vector_db"
@@ -18,14 +19,15 @@ def create_vector_db():
     print(f" Loaded {len(documents)} legal sections.")
 
     print(" Initializing Embedding Model (This converts text to numbers)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
 
     print("  Creating Vector Database (This might take a minute)...")
     
     vector_db = Chroma.from_documents(
         documents=documents,
         embedding=embeddings,
-        persist_directory=DB_PATH
+        persist_directory=DB_PATH,
+        collection_metadata=collection_metadata(DB_PATH)
     )
 
     print(f" Success! Vector Database created at '{DB_PATH}'")
@@ -0,0 +1,152 @@
+import os
+import csv
+import json
+import time
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from docx import Document
+from app_logic import rewrite_search_query, retrieve_batch, answer_from_context, gateway
+
+# --- CONFIGURATION ---
+WAVE_SIZE = 32     # Queries embedded and retrieved together
+CONCURRENCY = 8    # LLM calls in flight (the gateway still enforces provider limits)
+
+# --- INPUT / OUTPUT ---
+def read_queries(path):
+    """CSV with a `query` column (optional `id`) or JSONL of {"id", "query"}."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    return [{"id": str(row.get("id") or i + 1), "query": row["query"].strip()} for i, row in enumerate(rows) if row.get("query", "").strip()]
+
+def read_rows(out_path):
+    """Every complete row of the results JSONL. A torn line from a crash is skipped."""
+    rows = []
+    if os.path.exists(out_path):
+        with open(out_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return rows
+
+def load_done(out_path):
+    """Ids already answered in a previous (possibly interrupted) run. Failed rows are retried."""
+    return {row["id"] for row in read_rows(out_path) if "answer" in row}
+
+def repair_tail(out_path):
+    """Drop a half-written last line left by a crash, so the next row starts on its own line."""
+    if not os.path.exists(out_path):
+        return
+    with open(out_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        # Scan back to the last complete line
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+def _sources(context):
+    return [{"source": os.path.basename(d.metadata.get("source", "")), "page": d.metadata.get("page", 0) + 1} for d in context]
+
+def write_docx(out_path, docx_path):
+    """Collate every answered row of the JSONL into one Word document."""
+    doc = Document()
+    doc.add_heading('JurisOne Bulk Research', 0)
+    for row in read_rows(out_path):
+        if "answer" not in row:
+            continue
+        doc.add_heading(f"{row['id']}. {row['query']}", level=1)
+        for paragraph in row["answer"].split("\n"):
+            if paragraph.strip():
+                doc.add_paragraph(paragraph.strip())
+        sources = ", ".join(f"{s['source']} p.{s['page']}" for s in row["sources"])
+        doc.add_paragraph(f"Sources: {sources}", style="Intense Quote")
+    doc.save(docx_path)
+
+# --- PIPELINE ---
+def _submit(executor, fn, *args):
+    # Carry the gateway user and trace context into the worker thread
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+def run_bulk(in_path, out_path, docx_path=None, wave_size=WAVE_SIZE, concurrency=CONCURRENCY, user="bulk"):
+    items = read_queries(in_path)
+    repair_tail(out_path)
+    done = load_done(out_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"📋 {len(items)} queries, {len(done)} already answered, {len(pending)} to run.")
+
+    start = time.perf_counter()
+    answered = failed = 0
+    with gateway.user_context(user), ThreadPoolExecutor(max_workers=concurrency) as executor, open(out_path, "a", encoding="utf-8") as out:
+        for w in range(0, len(pending), wave_size):
+            wave = pending[w:w + wave_size]
+
+            # 1. Rewrite every query in the wave (concurrent LLM calls, same prompt as chat)
+            rewrites = [_submit(executor, rewrite_search_query, item["query"], "") for item in wave]
+            ready = []
+            for item, future in zip(wave, rewrites):
+                try:
+                    ready.append((item, future.result()))
+                except Exception as e:  # Record it and keep going; the row is retried on the next run
+                    out.write(json.dumps({"id": item["id"], "query": item["query"], "error": f"rewrite: {e}"}, ensure_ascii=False) + "\n")
+                    failed += 1
+            out.flush()
+            if not ready:
+                continue
+            wave, search_queries = [item for item, _ in ready], [q for _, q in ready]
+
+            # 2. One batched embed + retrieval for the whole wave
+            contexts = retrieve_batch(search_queries)
+
+            # 3. Answers stream to disk as they complete
+            futures = {_submit(executor, answer_from_context, item["query"], context): (item, search_query, context)
+                       for item, search_query, context in zip(wave, search_queries, contexts)}
+            for future in as_completed(futures):
+                item, search_query, context = futures[future]
+                row = {"id": item["id"], "query": item["query"], "search_query": search_query}
+                try:
+                    row.update(answer=future.result(), sources=_sources(context))
+                    answered += 1
+                except Exception as e:
+                    row["error"] = str(e)
+                    failed += 1
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+
+            elapsed = time.perf_counter() - start
+            print(f"   -> {answered + failed}/{len(pending)} done, {failed} failed, {answered / elapsed * 60:.1f} answers/min")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {answered} answered, {failed} failed in {elapsed:.1f}s ({answered / max(elapsed, 1e-9) * 60:.1f} answers/min).")
+    if docx_path:
+        write_docx(out_path, docx_path)
+        print(f"📄 DOCX written to {docx_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a CSV/JSONL list of research queries in bulk.")
+    parser.add_argument("input", help="CSV with a 'query' column, or JSONL with 'query' (and optional 'id')")
+    parser.add_argument("output", help="JSONL results file (appended to; rerun to resume)")
+    parser.add_argument("--docx", help="Also collate the results into this DOCX")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--wave-size", type=int, default=WAVE_SIZE)
+    parser.add_argument("--user", default="bulk", help="Name used for LLM usage accounting")
+    args = parser.parse_args()
+    run_bulk(args.input, args.output, args.docx, args.wave_size, args.concurrency, args.user)
@@ -0,0 +1,122 @@
+import os
+import re
+import hashlib
+import sqlite3
+
+# --- CONFIGURATION ---
+SEARCH_DB = os.getenv("CASE_SEARCH_DB", "case_search.sqlite3")
+SNIPPET_TOKENS = 14
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"  # Can't occur in chat text, unlike markdown's **
+MAX_RESULTS = 20
+
+# One row per chat message. Drafts are indexed in their own column so a hit in a petition
+# body ranks and snippets like any other text. `owner` is a single indexed token per user, so
+# MATCH narrows to one user's rows before bm25 runs instead of ranking the whole shared DB.
+# `indexed` holds how many messages of each case are in the index, which is what lets us
+# catch up incrementally (or rebuild from scratch).
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    content, draft, owner,
+    user UNINDEXED, case_id UNINDEXED, msg_index UNINDEXED, role UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed (
+    user TEXT NOT NULL, case_id TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (user, case_id)
+);
+"""
+
+def _connect(path=SEARCH_DB):
+    conn = sqlite3.connect(path, timeout=5)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        # Older layout: drop it and let sync_user() rebuild each user's cases on their next load
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS messages")
+            conn.execute("DROP TABLE IF EXISTS indexed")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _owner(user):
+    """Opaque one-token stand-in for the user name, which the tokenizer would otherwise split."""
+    return "u" + hashlib.sha1(user.encode("utf-8")).hexdigest()[:16]
+
+def _row(user, case_id, msg_index, message):
+    draft = message.get("draft") or {}
+    return (message.get("content", ""), draft.get("text", ""), _owner(user), user, case_id, msg_index, message.get("role", ""))
+
+def _insert(conn, user, case_id, start, messages):
+    conn.executemany(
+        "INSERT INTO messages (content, draft, owner, user, case_id, msg_index, role) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [_row(user, case_id, start + i, m) for i, m in enumerate(messages)],
+    )
+    conn.execute(
+        "INSERT INTO indexed (user, case_id, count) VALUES (?, ?, ?) ON CONFLICT(user, case_id) DO UPDATE SET count = excluded.count",
+        (user, case_id, start + len(messages)),
+    )
+
+# --- INDEXING ---
+def index_message(user, case_id, msg_index, message, path=SEARCH_DB):
+    """Add one appended message. Call right after it is saved to the chat store."""
+    with _connect(path) as conn:
+        row = conn.execute("SELECT count FROM indexed WHERE user = ? AND case_id = ?", (user, case_id)).fetchone()
+        if (row[0] if row else 0) != msg_index:
+            return False  # Index is behind or ahead of the store; sync_user() will repair this case
+        _insert(conn, user, case_id, msg_index, [message])
+        return True
+
+def sync_user(user, chats, path=SEARCH_DB):
+    """
+    Bring a user's index in line with their chats: append messages the index hasn't seen,
+    re-index cases that shrank or were removed. Only counts are compared, so this is
+    cheap to call on every page load, and it builds the whole index when the DB is missing.
+    """
+    with _connect(path) as conn:
+        counts = dict(conn.execute("SELECT case_id, count FROM indexed WHERE user = ?", (user,)).fetchall())
+        for case_id in set(counts) - set(chats):
+            conn.execute("DELETE FROM messages WHERE user = ? AND case_id = ?", (user, case_id))
+            conn.execute("DELETE FROM indexed WHERE user = ? AND case_id = ?", (user, case_id))
+        for case_id, history in chats.items():
+            done = counts.get(case_id, 0)
+            if done > len(history):
+                conn.execute("DELETE FROM messages WHERE user = ? AND case_id = ?", (user, case_id))
+                done = 0
+            if done < len(history) or case_id not in counts:
+                _insert(conn, user, case_id, done, history[done:])
+
+# --- SEARCH ---
+def _fts_query(text):
+    """Free text -> FTS5 query: every word must match, the last one as a prefix (search-as-you-type)."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def search(user, text, limit=MAX_RESULTS, path=SEARCH_DB):
+    """A user's best-matching messages, bm25-ranked, with **highlighted** snippets."""
+    query = _fts_query(text)
+    if query is None:
+        return []
+    # The owner column gets zero bm25 weight and is never snippeted, so it only filters
+    with _connect(path) as conn:
+        rows = conn.execute(
+            f"""SELECT case_id, msg_index, role,
+                       snippet(messages, 0, '{MARK_OPEN}', '{MARK_CLOSE}', '…', {SNIPPET_TOKENS}),
+                       snippet(messages, 1, '{MARK_OPEN}', '{MARK_CLOSE}', '…', {SNIPPET_TOKENS}),
+                       bm25(messages, 1.0, 1.0, 0.0)
+                FROM messages WHERE messages MATCH ?
+                ORDER BY bm25(messages, 1.0, 1.0, 0.0) LIMIT ?""",
+            (f'owner : "{_owner(user)}" AND {{content draft}} : ({query})', limit),
+        ).fetchall()
+    return [
+        {"case_id": case_id, "msg_index": int(msg_index), "role": role, "snippet": _best_snippet(content, draft), "score": -score}
+        for case_id, msg_index, role, content, draft, score in rows
+    ]
+
+def _best_snippet(content, draft):
+    """The column the hit came from, with **bold** marks like snippet(-1) used to give."""
+    snippet = content if MARK_OPEN in content else draft
+    return snippet.replace(MARK_OPEN, "**").replace(MARK_CLOSE, "**")
@@ -0,0 +1,191 @@
+import os
+import re
+import ast
+import csv
+import json
+from langchain_core.documents import Document
+from page_store import get_pages
+
+# --- CONFIGURATION ---
+DATA_FOLDER = "source_docs"
+CSV_PATH = "data/bns_cleaned.csv"
+INDEX_PATH = "vector_db/citation_index.json"  # Ships with the vector index it was built alongside
+MAX_PROVISION_CHARS = 4000
+
+# Canonical act -> (aliases people type, statute PDF in source_docs or None)
+ACTS = {
+    "BNS": (["bns", "bharatiya nyaya sanhita"], "BNS_2023.pdf"),
+    "BNSS": (["bnss", "bharatiya nagarik suraksha sanhita"], "BNSS.pdf"),
+    "BSA": (["bsa", "bharatiya sakshya adhiniyam"], "BSA.pdf"),
+    "IPC": (["ipc", "indian penal code"], None),
+    "CONSTITUTION": (["constitution", "constitution of india"], "Constitution.pdf"),
+    "NI": (["ni act", "n.i. act", "negotiable instruments act"], "negotiable_instruments_act,_1881.pdf"),
+    "CONTRACT": (["contract act", "indian contract act"], "THE INDIAN CONTRACT ACT, 1872.pdf"),
+    "HMA": (["hma", "hindu marriage act"], "THE HINDU MARRIAGE ACT, 1955.pdf"),
+    "HSA": (["hindu succession act"], "The Hindu Succession Act, 1956.pdf"),
+    "TPA": (["tpa", "transfer of property act"], "THE TRANSFER OF PROPERTY ACT, 1882.pdf"),
+    "RERA": (["rera", "real estate act", "real estate (regulation and development) act"], "THE REAL ESTATE (REGULATION AND DEVELOPMENT) ACT, 2016.pdf"),
+    "CPA": (["consumer protection act"], "ConsumerProtectionAct.pdf"),
+    "IT": (["it act", "information technology act"], "it_act_2000_updated.pdf"),
+    "MV": (["mv act", "motor vehicles act"], "motorvehiclesact.pdf"),
+    "DV": (["dv act", "pwdva", "domestic violence act"], "protection_of_women_from_domestic_violence_act,_2005.pdf"),
+    "SMA": (["special marriage act"], "special_marriage_act.pdf"),
+    "GWA": (["guardians and wards act"], "The Guardians and Wards Act, 1890.pdf"),
+    "CPC": (["cpc", "code of civil procedure"], "the_code_of_civil_procedure,_1908.pdf"),
+}
+
+# --- PARSING ---
+_ALIAS_TO_ACT = {alias: act for act, (aliases, _) in ACTS.items() for alias in aliases}
+_ALIAS_PATTERN = "|".join(re.escape(a) for a in sorted(_ALIAS_TO_ACT, key=len, reverse=True))
+_NUMBER = r"(\d{1,3}[A-Z]{0,3})(?:\s*\(\d+\))?"
+
+# "Section 138 of the NI Act", "S. 302 IPC", "u/s 498A IPC", "Article 21". A bare "302 IPC" only
+# counts when it is the whole query: "give me 5 IPC offences" is not a citation of IPC 5.
+_SECTION_MARKER = r"(?:sections?|sec\.?|s\.|u/s\.?)"
+_SECTION_RE = re.compile(rf"\b{_SECTION_MARKER}\s*{_NUMBER}\s+(?:of\s+(?:the\s+)?)?({_ALIAS_PATTERN})\b", re.IGNORECASE)
+_BARE_SECTION_RE = re.compile(rf"\b{_SECTION_MARKER}?\s*{_NUMBER}\s+(?:of\s+(?:the\s+)?)?({_ALIAS_PATTERN})\b", re.IGNORECASE)
+_ARTICLE_RE = re.compile(rf"\b(?:article|art\.)\s*{_NUMBER}", re.IGNORECASE)
+_CITATION_ONLY_WORDS = {"and", "or", "vs", "v", "section", "sections", "sec", "s", "u"}
+
+def _is_citation_only(text):
+    rest = _ARTICLE_RE.sub(" ", _BARE_SECTION_RE.sub(" ", text))
+    return not set(re.findall(r"[a-z]+", rest.lower())) - _CITATION_ONLY_WORDS
+
+def parse_citations(text):
+    """Explicit (act, section) citations in a query, in order of appearance, without duplicates."""
+    found = []
+    section_re = _BARE_SECTION_RE if _is_citation_only(text) else _SECTION_RE
+    for match in section_re.finditer(text):
+        found.append((match.start(), _ALIAS_TO_ACT[match.group(2).lower()], match.group(1).upper()))
+    for match in _ARTICLE_RE.finditer(text):
+        found.append((match.start(), "CONSTITUTION", match.group(1).upper()))
+    seen = []
+    for _, act, section in sorted(found):
+        if (act, section) not in seen:
+            seen.append((act, section))
+    return seen
+
+def _key(act, section):
+    return f"{act}:{section.replace(' ', '').upper()}"
+
+# --- BUILDING ---
+# A provision starts on a line like "138. Dishonour of cheque ...—" or "98. Whoever ...".
+_HEADING_RE = re.compile(r"(?m)^[ \t]*(\d{1,3}[A-Z]{0,3})\.[ \t]*\n?[ \t]*(\S.*)$")
+
+def _provisions_from_pdf(act, pdf_path):
+    """
+    Split a statute into numbered provisions. Tables of contents and schedules reuse the
+    same numbers, so for each number we prefer the first block written in body style
+    ("Heading.—text"), falling back to the longest block.
+    """
+    pages = list(get_pages(pdf_path))
+    text = "\n".join(pages)
+    page_starts = [0]
+    for page in pages:
+        page_starts.append(page_starts[-1] + len(page) + 1)
+
+    matches = list(_HEADING_RE.finditer(text))
+    best = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        block = text[match.start():end].strip()
+        body_style = "—" in block[:250]
+        section = match.group(1)
+        current = best.get(section)
+        if current is None or (body_style and not current[0]) or (body_style == current[0] and not body_style and len(block) > len(current[2])):
+            page = max(p for p, start in enumerate(page_starts[:-1]) if start <= match.start())
+            best[section] = (body_style, page, block)
+
+    return {
+        _key(act, section): {
+            "act": act, "section": section, "title": block.split("\n", 1)[0][:200],
+            "text": block[:MAX_PROVISION_CHARS], "source": pdf_path, "page": page,
+        }
+        for section, (_, page, block) in best.items()
+    }
+
+def _provisions_from_csv(csv_path=CSV_PATH):
+    """IPC and BNS provisions from the cleaned IPC->BNS mapping rows."""
+    index = {}
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for row_number, row in enumerate(csv.DictReader(f)):
+            try:
+                data = ast.literal_eval(row["response"])
+            except (ValueError, SyntaxError):
+                continue
+            ipc, bns = str(data.get("IPC Section", "")).strip(), str(data.get("BNS Section", "")).strip()
+            if ipc:
+                index[_key("IPC", ipc)] = {
+                    "act": "IPC", "section": ipc, "title": data.get("IPC Heading", ""),
+                    "text": f"{data.get('IPC Descriptions', '').strip()}\n\nCorresponding BNS Section {bns}: {data.get('BNS Heading', '')}"[:MAX_PROVISION_CHARS],
+                    "source": csv_path, "page": row_number,
+                }
+            if bns and _key("BNS", bns) not in index:
+                index[_key("BNS", bns)] = {
+                    "act": "BNS", "section": bns, "title": data.get("BNS Heading", ""),
+                    "text": data.get("BNS description", "").strip()[:MAX_PROVISION_CHARS],
+                    "source": csv_path, "page": row_number,
+                }
+    return index
+
+def build_citation_index(data_folder=DATA_FOLDER, csv_path=CSV_PATH, index_path=INDEX_PATH):
+    """Precompute (act, section) -> provision text for every statute we hold. Run at ingest."""
+    index = {}
+    for act, (_, filename) in ACTS.items():
+        if filename and os.path.exists(os.path.join(data_folder, filename)):
+            provisions = _provisions_from_pdf(act, os.path.join(data_folder, filename))
+            index.update(provisions)
+            print(f"   -> {act}: {len(provisions)} provisions")
+    if os.path.exists(csv_path):
+        for key, provision in _provisions_from_csv(csv_path).items():
+            index.setdefault(key, provision)  # Statute PDF text wins where we have both
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    print(f"📑 Citation index: {len(index)} provisions -> {index_path}")
+    return index
+
+# --- LOOKUP ---
+class CitationIndex:
+    """O(1) exact provision lookup. Loads the JSON built at ingest on first use."""
+
+    def __init__(self, index_path=INDEX_PATH):
+        self.index_path = index_path
+        self._index = None
+
+    def _load(self):
+        if self._index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            else:
+                self._index = {}
+        return self._index
+
+    def lookup(self, act, section):
+        index = self._load()
+        provision = index.get(_key(act, section))
+        if provision is None:
+            base = re.match(r"\d+[A-Z]*", section)  # "1(3)" -> "1"
+            provision = index.get(_key(act, base.group(0))) if base else None
+        return provision
+
+    def documents_for(self, query):
+        """Exact provision Documents for every citation in the query that we can resolve."""
+        documents = []
+        for act, section in parse_citations(query):
+            provision = self.lookup(act, section)
+            if provision:
+                label = "Article" if act == "CONSTITUTION" else "Section"
+                header = f"{act} {label} {provision['section']}"
+                if not provision["text"].startswith(provision["title"]):
+                    header = f"{header}: {provision['title']}"
+                documents.append(Document(
+                    page_content=f"{header}\n{provision['text']}",
+                    metadata={"source": provision["source"], "page": provision["page"], "citation": f"{act} {provision['section']}"},
+                ))
+        return documents
+
+if __name__ == "__main__":
+    build_citation_index()
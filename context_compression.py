@@ -0,0 +1,160 @@
+import os
+import re
+import ast
+import math
+
+# --- CONFIGURATION ---
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CHARS_PER_TOKEN = 4
+MIN_SENTENCE_CHARS = 20
+OVERLAP_PROBE_CHARS = 60  # A chunk's opening this long found in its neighbour means they overlap
+
+# Running headers, gazette furniture and page numbers that PDF extraction leaves in chunks
+BOILERPLATE_PATTERNS = [
+    re.compile(r"^\s*\d{1,4}\s*$"),
+    re.compile(r"^\s*THE GAZETTE OF INDIA.*$", re.IGNORECASE),
+    re.compile(r"^\s*SEC\.\s*\d+\]\s*$", re.IGNORECASE),
+    re.compile(r"^\s*\[?PART\s+[IVX]+\s*[—-].*$", re.IGNORECASE),
+    re.compile(r"^\s*THE CONSTITUTION OF\s+INDIA\s*$", re.IGNORECASE),
+    re.compile(r"^\s*\(Part [IVXA-Z]+\.?—.*\)\s*$"),
+    re.compile(r"^\s*Page \d+ of \d+\s*$", re.IGNORECASE),
+    re.compile(r"^\s*www\.\S+\s*$", re.IGNORECASE),
+]
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.;:?])\s+(?=[\"“(A-Z0-9])")
+
+# --- CLEANING ---
+def _clean_csv_row(text):
+    """BNS CSV rows are 'Query: ...\\nLegal Explanation: {dict}'. Keep only the legal text."""
+    if "Legal Explanation:" not in text:
+        return text
+    explanation = text.split("Legal Explanation:", 1)[1].strip()
+    try:
+        data = ast.literal_eval(explanation)
+    except (ValueError, SyntaxError):
+        # Truncated dict: drop the keys and quoting, keep the prose
+        return re.sub(r"'(IPC|BNS) [A-Za-z ]+':\s*'?|[{}']", " ", explanation)
+    return "\n".join([
+        f"IPC Section {data.get('IPC Section', '')} ({data.get('IPC Heading', '')}): {data.get('IPC Descriptions', '').strip()}",
+        f"BNS Section {data.get('BNS Section', '')} ({data.get('BNS Heading', '')}): {data.get('BNS description', '').strip()}",
+    ])
+
+def clean_text(text):
+    text = _clean_csv_row(text)
+    lines = [line for line in text.split("\n") if not any(p.match(line) for p in BOILERPLATE_PATTERNS)]
+    text = "\n".join(lines).replace("\xa0", " ")
+    text = re.sub(r"-\n(?=[a-z])", "", text)        # Re-join hyphenated line wraps
+    text = re.sub(r"(?<![.;:—])\n(?=[a-z(])", " ", text)  # Re-join soft-wrapped lines
+    return re.sub(r"[ \t]+", " ", text).strip()
+
+# --- DEDUPE & MERGE ---
+def _merge_overlapping(first, second):
+    """`first` + the part of `second` it doesn't already contain, or None if they don't overlap."""
+    if second in first:
+        return first
+    probe = second[:OVERLAP_PROBE_CHARS]
+    at = first.rfind(probe)
+    if at != -1 and second.startswith(first[at:]):
+        return first[:at] + second
+    return None
+
+def merge_chunks(docs):
+    """
+    Group chunks by source, dedupe the 200-char ingest overlaps and join chunks that
+    continue each other (same or next page). Returns dicts with source, page, text and exact.
+    """
+    groups = {}
+    for order, doc in enumerate(docs):
+        key = doc.metadata.get("source", "")
+        groups.setdefault(key, []).append((doc.metadata.get("page", 0), order, clean_text(doc.page_content), "citation" in doc.metadata))
+
+    merged = []
+    for source, chunks in groups.items():
+        chunks.sort(key=lambda c: (c[0], c[1]))
+        current = None
+        for page, order, text, exact in chunks:
+            if current is not None and page - current["last_page"] <= 1:
+                joined = _merge_overlapping(current["text"], text)
+                if joined is None and page == current["last_page"] + 1:
+                    joined = f"{current['text']}\n{text}"
+                if joined is not None:
+                    current.update(text=joined, last_page=page, order=min(current["order"], order), exact=current["exact"] or exact)
+                    continue
+            if current is not None:
+                merged.append(current)
+            current = {"source": source, "page": page, "last_page": page, "order": order, "text": text, "exact": exact}
+        if current is not None:
+            merged.append(current)
+
+    merged.sort(key=lambda m: m["order"])  # Keep the retriever's ranking between sources
+    return merged
+
+# --- SENTENCE SELECTION ---
+def split_sentences(text):
+    """Sentences of at least MIN_SENTENCE_CHARS. Short fragments such as "103." are carried
+    into the next sentence so section numbers stay attached to their text."""
+    sentences = []
+    carry = ""
+    for paragraph in text.split("\n"):
+        for piece in _SENTENCE_SPLIT.split(paragraph):
+            piece = f"{carry} {piece.strip()}".strip()
+            if len(piece) < MIN_SENTENCE_CHARS:
+                carry = piece
+            else:
+                sentences.append(piece)
+                carry = ""
+    if carry and sentences:
+        sentences[-1] = f"{sentences[-1]} {carry}"
+    return sentences
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def compress_context(query, docs, embeddings, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    The prompt-ready context string: cleaned, deduplicated, merged, and cut down to the
+    sentences most similar to the query within `token_budget`. Exact citation provisions
+    are kept whole first. Every block keeps its [Source: file, p. N] label.
+    """
+    blocks = merge_chunks(docs)
+    budget = token_budget * CHARS_PER_TOKEN
+
+    keep = {}  # block index -> set of sentence indexes
+    candidates = []
+    for b, block in enumerate(blocks):
+        block["sentences"] = split_sentences(block["text"]) or [block["text"]]
+        if block["exact"]:
+            for s, sentence in enumerate(block["sentences"]):
+                if budget - len(sentence) < 0:
+                    break
+                keep.setdefault(b, set()).add(s)
+                budget -= len(sentence)
+        else:
+            candidates.extend((b, s) for s in range(len(block["sentences"])))
+
+    if candidates and budget > 0:
+        texts = [blocks[b]["sentences"][s] for b, s in candidates]
+        vectors = embeddings.embed_documents([query] + texts)
+        scores = [_cosine(vectors[0], v) for v in vectors[1:]]
+        for score, (b, s) in sorted(zip(scores, candidates), key=lambda x: x[0], reverse=True):
+            length = len(blocks[b]["sentences"][s])
+            if length > budget:
+                continue
+            keep.setdefault(b, set()).add(s)
+            budget -= length
+
+    parts = []
+    for b, block in enumerate(blocks):
+        if b not in keep:
+            continue
+        name = os.path.basename(block["source"].replace("\\", "/"))
+        pieces, previous = [], None
+        for s in sorted(keep[b]):
+            if previous is not None and s != previous + 1:
+                pieces.append("…")
+            pieces.append(block["sentences"][s])
+            previous = s
+        parts.append(f"[Source: {name}, p. {block['page'] + 1}]\n" + " ".join(pieces))
+    return "\n\n".join(parts)
@@ -0,0 +1,336 @@
+import os
+import time
+import sqlite3
+import datetime
+import threading
+import urllib.robotparser
+from urllib.parse import urlparse, urldefrag, unquote
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import lxml.html
+
+# --- CONFIGURATION ---
+FRONTIER_DB = "crawl_frontier.sqlite3"
+DOWNLOAD_FOLDER = "source_docs"
+SEEDS_FILE = "data/crawl_seeds.txt"  # One listing-page URL per line
+USER_AGENT = "JurisOneHarvester/1.0 (legal research; polite crawler)"
+MAX_DEPTH = 2                 # Seed listing -> linked listing -> PDF
+MAX_WORKERS = 6
+PER_DOMAIN_CONCURRENCY = 2
+PER_DOMAIN_DELAY_S = 2.0      # Minimum gap between requests to one host
+REQUEST_TIMEOUT = 20
+MAX_ATTEMPTS = 3
+MAX_PDF_BYTES = 50 * 1024 * 1024
+DAILY_BYTE_BUDGET = int(os.getenv("CRAWL_DAILY_BYTES", str(500 * 1024 * 1024)))
+DAILY_DOC_BUDGET = int(os.getenv("CRAWL_DAILY_DOCS", "100"))
+RECRAWL_PAGES_AFTER_H = float(os.getenv("CRAWL_RECRAWL_PAGES_AFTER_H", "20"))  # Listings change daily; PDFs never re-fetched
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    priority REAL NOT NULL,
+    kind TEXT NOT NULL,              -- 'page' or 'pdf'
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    discovered_at TEXT NOT NULL,
+    fetched_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS frontier_next ON frontier (status, priority DESC);
+CREATE TABLE IF NOT EXISTS budget (day TEXT PRIMARY KEY, bytes INTEGER NOT NULL, docs INTEGER NOT NULL);
+"""
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _today():
+    return datetime.date.today().isoformat()
+
+def _is_pdf_url(url):
+    return urlparse(url).path.lower().endswith(".pdf")
+
+def _priority(kind, depth):
+    return (10 if kind == "pdf" else 5) - depth  # Finish documents before exploring wider
+
+# --- FRONTIER ---
+class Frontier:
+    """
+    Persistent priority queue of URLs. Survives crashes: in-flight rows go back to pending on open.
+    Downloaded PDFs stay done for good; listing pages fetched more than `recrawl_after_h`
+    hours ago are re-queued so new links on them are found.
+    """
+
+    def __init__(self, path=FRONTIER_DB, recrawl_after_h=RECRAWL_PAGES_AFTER_H):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("UPDATE frontier SET status = 'pending' WHERE status = 'in_progress'")
+            self.conn.execute(
+                "UPDATE frontier SET status = 'pending', attempts = 0 WHERE kind = 'page' AND status IN ('done', 'failed') AND fetched_at <= ?",
+                ((datetime.datetime.now() - datetime.timedelta(hours=recrawl_after_h)).strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+
+    def add(self, url, depth):
+        url = urldefrag(url)[0]
+        kind = "pdf" if _is_pdf_url(url) else "page"
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (url, domain, depth, priority, kind, discovered_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, urlparse(url).netloc, depth, _priority(kind, depth), kind, _now()),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, busy_domains):
+        """Highest-priority pending URL on a host that isn't at its concurrency limit."""
+        placeholders = ",".join("?" * len(busy_domains))
+        exclude = f"AND domain NOT IN ({placeholders})" if busy_domains else ""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                f"SELECT url, domain, depth, kind FROM frontier WHERE status = 'pending' {exclude} ORDER BY priority DESC, discovered_at LIMIT 1",
+                list(busy_domains),
+            ).fetchone()
+            if row:
+                self.conn.execute("UPDATE frontier SET status = 'in_progress', attempts = attempts + 1 WHERE url = ?", (row[0],))
+            return row
+
+    def finish(self, url, status="done", error=None):
+        with self.lock, self.conn:
+            if status == "failed":
+                # Transient failures go back in the queue until MAX_ATTEMPTS
+                self.conn.execute(
+                    "UPDATE frontier SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?, fetched_at = ? WHERE url = ?",
+                    (MAX_ATTEMPTS, error, _now(), url),
+                )
+            else:
+                self.conn.execute("UPDATE frontier SET status = ?, error = ?, fetched_at = ? WHERE url = ?", (status, error, _now(), url))
+
+    def release(self, url):
+        """Put a claimed URL back untouched (e.g. the daily budget ran out mid-fetch)."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE frontier SET status = 'pending', attempts = attempts - 1 WHERE url = ?", (url,))
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM frontier WHERE status IN ('pending', 'in_progress')").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status").fetchall())
+
+    # Daily budget
+    def charge(self, nbytes, docs=0):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO budget (day, bytes, docs) VALUES (?, ?, ?) ON CONFLICT(day) DO UPDATE SET bytes = bytes + excluded.bytes, docs = docs + excluded.docs",
+                (_today(), nbytes, docs),
+            )
+
+    def used_today(self):
+        with self.lock:
+            row = self.conn.execute("SELECT bytes, docs FROM budget WHERE day = ?", (_today(),)).fetchone()
+        return row or (0, 0)
+
+# --- POLITENESS ---
+class DomainLimiter:
+    """Per-host concurrency slots, a minimum delay between requests, and robots.txt."""
+
+    def __init__(self, concurrency=PER_DOMAIN_CONCURRENCY, delay=PER_DOMAIN_DELAY_S, respect_robots=True):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.respect_robots = respect_robots
+        self.active = {}
+        self.next_slot = {}
+        self.robots = {}
+        self.lock = threading.Lock()
+
+    def busy_domains(self):
+        with self.lock:
+            return [d for d, n in self.active.items() if n >= self.concurrency]
+
+    def reserve(self, domain):
+        """Take a concurrency slot. Called by the dispatcher before submitting, so the cap holds."""
+        with self.lock:
+            self.active[domain] = self.active.get(domain, 0) + 1
+
+    def wait_turn(self, domain):
+        """Block until the per-host delay since the previous request has passed."""
+        with self.lock:
+            start = max(time.monotonic(), self.next_slot.get(domain, 0.0))
+            self.next_slot[domain] = start + self.delay
+        time.sleep(max(0.0, start - time.monotonic()))
+
+    def release(self, domain):
+        with self.lock:
+            self.active[domain] -= 1
+
+    def allowed(self, session, url):
+        if not self.respect_robots:
+            return True
+        parsed = urlparse(url)
+        root = f"{parsed.scheme}://{parsed.netloc}"
+        if root not in self.robots:
+            parser = urllib.robotparser.RobotFileParser()
+            try:
+                response = session.get(f"{root}/robots.txt", timeout=REQUEST_TIMEOUT)
+                parser.parse(response.text.splitlines() if response.status_code == 200 else [])
+            except requests.RequestException:
+                parser.parse([])
+            self.robots[root] = parser
+        return self.robots[root].can_fetch(USER_AGENT, url)
+
+# --- CRAWLER ---
+class BudgetExhausted(Exception):
+    pass
+
+def extract_links(html, base_url):
+    """Absolute hrefs from a listing page (lxml: fast, tolerant of broken court-site HTML)."""
+    try:
+        doc = lxml.html.fromstring(html)
+    except (lxml.etree.ParserError, ValueError):
+        return []
+    doc.make_links_absolute(base_url, resolve_base_href=True)
+    return [link for element, attribute, link, _ in doc.iterlinks() if element.tag == "a" and attribute == "href"]
+
+def _pdf_filename(url):
+    filename = os.path.basename(unquote(urlparse(url).path))
+    if not filename.lower().endswith(".pdf"):
+        filename = f"harvest_{int(time.time() * 1000)}.pdf"
+    return filename
+
+class Crawler:
+    """
+    Browser-free harvester. Listing pages are parsed for links; PDFs are saved to
+    DOWNLOAD_FOLDER. `fallback_fetcher(url) -> html` (e.g. Selenium) is only used for
+    listing pages that come back without any links, such as JavaScript-rendered ones.
+    """
+
+    def __init__(self, seeds, frontier=None, allowed_domains=None, download_folder=DOWNLOAD_FOLDER,
+                 max_depth=MAX_DEPTH, workers=MAX_WORKERS, limiter=None, fallback_fetcher=None, log=print,
+                 byte_budget=DAILY_BYTE_BUDGET, doc_budget=DAILY_DOC_BUDGET):
+        self.frontier = frontier or Frontier()
+        self.allowed_domains = set(allowed_domains or (urlparse(s).netloc for s in seeds))
+        self.download_folder = download_folder
+        self.max_depth = max_depth
+        self.workers = workers
+        self.limiter = limiter or DomainLimiter()
+        self.fallback_fetcher = fallback_fetcher
+        self.log = log
+        self.byte_budget = byte_budget
+        self.doc_budget = doc_budget
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.downloaded = []
+        self.budget_lock = threading.Lock()
+        for seed in seeds:
+            self.frontier.add(seed, 0)
+
+    def budget_left(self):
+        nbytes, docs = self.frontier.used_today()
+        return nbytes < self.byte_budget and docs < self.doc_budget
+
+    def _fetch_page(self, url, depth):
+        response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        self.frontier.charge(len(response.content))
+        if "pdf" in response.headers.get("Content-Type", "").lower():
+            return self._save_pdf(url, response.content)
+
+        links = extract_links(response.content, url)
+        if not links and self.fallback_fetcher:
+            self.log(f"   🧭 No links in {url[:60]}, trying browser fallback...")
+            links = extract_links(self.fallback_fetcher(url), url)
+
+        added = 0
+        for link in links:
+            parsed = urlparse(link)
+            if parsed.scheme not in ("http", "https") or parsed.netloc not in self.allowed_domains:
+                continue
+            if depth + 1 > self.max_depth and not _is_pdf_url(link):
+                continue
+            added += self.frontier.add(link, depth + 1)
+        self.log(f"   🔗 {url[:60]}: {len(links)} links, {added} new")
+
+    def _save_pdf(self, url, content=None):
+        filepath = os.path.join(self.download_folder, _pdf_filename(url))
+        if os.path.exists(filepath):
+            return
+        if content is None:
+            with self.session.get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                if "pdf" not in response.headers.get("Content-Type", "").lower():
+                    raise ValueError(f"not a PDF ({response.headers.get('Content-Type')})")
+                if int(response.headers.get("Content-Length") or 0) > MAX_PDF_BYTES:
+                    raise ValueError("PDF larger than MAX_PDF_BYTES")
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > MAX_PDF_BYTES:
+                        raise ValueError("PDF larger than MAX_PDF_BYTES")
+                    chunks.append(chunk)
+                content = b"".join(chunks)
+            self.frontier.charge(len(content))
+        # Workers finish downloads concurrently: check and spend the document budget atomically
+        with self.budget_lock:
+            if self.frontier.used_today()[1] >= self.doc_budget:
+                raise BudgetExhausted(url)
+            with open(filepath, "wb") as f:
+                f.write(content)
+            self.frontier.charge(0, docs=1)
+        self.downloaded.append(os.path.basename(filepath))
+        self.log(f"   ⬇️ Downloaded: {os.path.basename(filepath)}")
+
+    def _process(self, url, domain, depth, kind):
+        """Runs holding the domain slot run() reserved; always gives it back."""
+        try:
+            if not self.limiter.allowed(self.session, url):
+                self.frontier.finish(url, "skipped", "robots.txt")
+                return
+            self.limiter.wait_turn(domain)
+            if kind == "pdf":
+                self._save_pdf(url)
+            else:
+                self._fetch_page(url, depth)
+            self.frontier.finish(url)
+        except BudgetExhausted:
+            self.frontier.release(url)  # Tomorrow's run picks it up
+        except Exception as e:
+            self.log(f"   ⚠️ {url[:60]}: {e}")
+            self.frontier.finish(url, "failed", str(e)[:200])
+        finally:
+            self.limiter.release(domain)
+
+    def run(self):
+        """Crawl until the frontier is empty or today's budget is spent. Returns new PDF filenames."""
+        os.makedirs(self.download_folder, exist_ok=True)
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                in_flight = {f for f in in_flight if not f.done()}
+                if not self.budget_left():
+                    self.log("💰 Daily crawl budget reached.")
+                    break
+                if len(in_flight) >= self.workers:
+                    time.sleep(0.05)
+                    continue
+                row = self.frontier.claim(self.limiter.busy_domains())
+                if row is None:
+                    if not in_flight:
+                        break
+                    time.sleep(0.05)  # Waiting on busy hosts or pages that may add links
+                    continue
+                self.limiter.reserve(row[1])  # Same thread as busy_domains(), so no host exceeds its cap
+                in_flight.add(pool.submit(self._process, *row))
+        self.log(f"🏁 Crawl stopped. Frontier: {self.frontier.stats()}")
+        return self.downloaded
+
+def load_seeds(path=SEEDS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+if __name__ == "__main__":
+    Crawler(load_seeds()).run()
@@ -4,17 +4,16 @@ import requests
 import subprocess
 import sys
 import datetime
+import threading
 from urllib.parse import urlparse, unquote
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from crawler import Crawler, load_seeds
 
 # --- CONFIGURATION ---
 DOWNLOAD_FOLDER = "source_docs"
 LOG_FILE = "harvest_log.txt"
 TARGET_COUNT = 30  # Try to find this many PDFs per run
+HARVEST_MODE = os.getenv("HARVEST_MODE", "http")  # "http" crawls seed listings; "browser" is the old Google/Selenium run
+BROWSER_FALLBACK = os.getenv("HARVEST_BROWSER_FALLBACK", "1") == "1"
 
 # Queries designed to find BULK legal PDFs
 SEARCH_QUERIES = [
@@ -33,6 +32,12 @@ def log(message):
 
 def setup_driver():
     """Starts a Headless Chrome Browser"""
+    # Selenium is only needed for browser mode and the crawler's fallback, so import it here
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Run in background
     chrome_options.add_argument("--disable-gpu")
@@ -63,7 +68,42 @@ def download_pdf(url):
         pass
     return None
 
+class BrowserFetcher:
+    """
+    Crawler fallback for JavaScript-rendered listings. Chrome starts on first use only.
+    Crawler workers call this concurrently and WebDriver is not thread-safe, so one page at a time.
+    """
+
+    def __init__(self):
+        self.driver = None
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            if self.driver is None:
+                self.driver = setup_driver()
+            self.driver.get(url)
+            time.sleep(3)  # Wait for page scripts to render the listing
+            return self.driver.page_source
+
+    def quit(self):
+        with self.lock:
+            if self.driver is not None:
+                self.driver.quit()
+                self.driver = None
+
+def harvest_http():
+    fallback = BrowserFetcher() if BROWSER_FALLBACK else None
+    try:
+        crawler = Crawler(load_seeds(), fallback_fetcher=fallback, log=log)
+        return len(crawler.run())
+    finally:
+        if fallback:
+            fallback.quit()
+
 def harvest_google(driver):
+    from selenium.webdriver.common.by import By
+
     total_downloaded = 0
     
     for query in SEARCH_QUERIES:
@@ -117,9 +157,12 @@ if __name__ == "__main__":
     log("🚜 Starting Daily Harvest...")
     
     try:
-        driver = setup_driver()
-        count = harvest_google(driver)
-        driver.quit()
+        if HARVEST_MODE == "browser":
+            driver = setup_driver()
+            count = harvest_google(driver)
+            driver.quit()
+        else:
+            count = harvest_http()
         
         log(f"🏁 Harvest Complete. Collected {count} new documents.")
         
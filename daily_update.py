@@ -131,14 +131,14 @@ def run_ingestion():
         return False
 
 def push_to_cloud():
-    log("☁️ Pushing to Cloud...")
+    """Publish the rebuilt index, plus the new source PDFs by doc hash, as a versioned artifact instead of committing binaries to git."""
+    from index_artifacts import publish
+    log("☁️ Publishing index artifact...")
     try:
-        subprocess.run(["git", "add", "."], check=True)
-        subprocess.run(["git", "commit", "-m", f"Auto-update: {datetime.date.today()}"], check=True)
-        subprocess.run(["git", "push"], check=True)
-        log("🚀 Deployed!")
+        latest = publish()
+        log(f"🚀 Published index {latest['version']} ({latest['full']}{', delta ' + latest['delta'] if 'delta' in latest else ''})")
     except Exception as e:
-        log(f"❌ Deploy Failed: {e}")
+        log(f"❌ Publish Failed: {e}")
 
 if __name__ == "__main__":
     if not os.path.exists(DOWNLOAD_FOLDER):
@@ -0,0 +1,141 @@
+import os
+import io
+import hashlib
+import tempfile
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from docx import Document
+from fpdf import FPDF
+from fpdf.errors import FPDFException
+from telemetry import trace_span
+
+# --- CONFIGURATION ---
+EXPORT_CACHE_DIR = "draft_cache"
+EXPORT_FORMATS = ("docx", "pdf")
+RENDER_VERSION = 2  # Bump when renderer output changes, so stale cached files aren't served
+
+# First TTF found wins for the body text: Latin, ₹ and “quotes”. DejaVu and Noto Sans have no
+# Devanagari, so Hindi names come from the fallback font below.
+PDF_FONT_CANDIDATES = [
+    os.getenv("PDF_FONT_PATH", ""),
+    "fonts/NotoSans-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "C:/Windows/Fonts/Nirmala.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+PDF_DEVANAGARI_FONT_CANDIDATES = [
+    os.getenv("PDF_DEVANAGARI_FONT_PATH", ""),
+    "fonts/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf",  # Debian/Ubuntu fonts-noto-core
+    "/usr/share/fonts/google-noto/NotoSansDevanagari-Regular.ttf",  # Fedora
+    "/usr/share/fonts/truetype/lohit-devanagari/Lohit-Devanagari.ttf",
+    "C:/Windows/Fonts/Nirmala.ttf",
+    "C:/Windows/Fonts/mangal.ttf",
+]
+
+# Long drafts render off the Streamlit request thread
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="draft-export")
+
+# --- ARTIFACTS ---
+def draft_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def make_draft_artifact(doc_type, text):
+    """The record stored on the assistant message in the case file."""
+    return {
+        "id": draft_id(text),
+        "doc_type": doc_type,
+        "text": text,
+        "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+# --- RENDERERS ---
+def render_docx(text):
+    doc = Document()
+    doc.add_heading('JurisOne Legal Draft', 0)
+    for paragraph in text.split('\n'):
+        if paragraph.strip():
+            doc.add_paragraph(paragraph.strip())
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def _find_font(candidates):
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+_warned = set()
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(message)
+
+def _enable_devanagari(pdf):
+    """Fallback font for glyphs the body font lacks, shaped so conjuncts and matras join."""
+    font_path = _find_font(PDF_DEVANAGARI_FONT_CANDIDATES)
+    if not font_path:
+        _warn_once("⚠️ No Devanagari font found (set PDF_DEVANAGARI_FONT_PATH); Hindi text will be dropped from PDFs")
+        return
+    pdf.add_font("DraftDevanagari", fname=font_path)
+    pdf.set_fallback_fonts(["DraftDevanagari"], exact_match=False)
+    try:
+        pdf.set_text_shaping(True)
+    except FPDFException as e:  # uharfbuzz missing: glyphs still render, but unjoined
+        _warn_once(f"⚠️ PDF text shaping unavailable: {e}")
+
+def render_pdf(text):
+    pdf = FPDF()
+    pdf.add_page()
+    font_path = _find_font(PDF_FONT_CANDIDATES)
+    if font_path:
+        pdf.add_font("DraftBody", fname=font_path)
+        pdf.set_font("DraftBody", size=11)
+        _enable_devanagari(pdf)
+    else:
+        # No Unicode font installed: fall back to the core font (lossy for non-Latin text)
+        pdf.set_font("Helvetica", size=11)
+        text = text.encode('latin-1', 'replace').decode('latin-1')
+    pdf.multi_cell(0, 8, text)
+    return bytes(pdf.output())
+
+RENDERERS = {"docx": render_docx, "pdf": render_pdf}
+
+# --- CACHED EXPORT ---
+def _cache_path(text, fmt):
+    return os.path.join(EXPORT_CACHE_DIR, f"{draft_id(text)}.v{RENDER_VERSION}.{fmt}")
+
+def is_cached(text, fmt):
+    return os.path.exists(_cache_path(text, fmt))
+
+def get_export(text, fmt):
+    """Rendered bytes for a draft, rendered at most once per draft hash and format."""
+    if fmt not in RENDERERS:
+        raise ValueError(f"❌ Unknown export format '{fmt}'")
+    path = _cache_path(text, fmt)
+    with trace_span(f"render_{fmt}", chars=len(text)) as span:
+        if os.path.exists(path):
+            span.set(cache_hit=True)
+            with open(path, "rb") as f:
+                return f.read()
+
+        data = RENDERERS[fmt](text)
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        # Unique temp file per writer, then an atomic rename: concurrent renders of the same
+        # draft each publish a complete file and readers never see a partial one
+        fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=f".{fmt}.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return data
+
+def submit_export(text, fmt):
+    """Render on the background pool. Returns a Future of the bytes."""
+    return _executor.submit(get_export, text, fmt)
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import math
+
+# --- CONFIGURATION ---
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default (all cores)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# Quantized exports shipped in the model repo. avx512_vnni for modern Xeons,
+# quint8_avx2 for older x86, qint8_arm64 for Graviton/Apple.
+ONNX_INT8_FILE = os.getenv("ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+
+BENCHMARK_QUERIES = "data/benchmark_queries.txt"
+DB_PATH = "vector_db"
+PARITY_MIN_COSINE = 0.98   # Per-query embedding agreement with the PyTorch baseline
+PARITY_MIN_OVERLAP = 0.8   # Mean top-k overlap with the PyTorch baseline
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def _onnx_session_options(threads):
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return options
+
+def get_embeddings(backend=None, threads=None):
+    """The one place that builds the MiniLM embedder, so ingest and query time always agree."""
+    # Imported here so modules that only need the constants don't pull in torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    backend = backend or EMBEDDING_BACKEND
+    threads = EMBEDDING_THREADS if threads is None else threads
+    if backend not in BACKENDS:
+        raise ValueError(f"❌ Unknown EMBEDDING_BACKEND '{backend}' (expected one of {BACKENDS})")
+
+    model_kwargs = {"device": "cpu"}
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+    else:
+        onnx_kwargs = {"provider": "CPUExecutionProvider", "session_options": _onnx_session_options(threads)}
+        if backend == "onnx-int8":
+            onnx_kwargs["file_name"] = ONNX_INT8_FILE
+        model_kwargs.update({"backend": "onnx", "model_kwargs": onnx_kwargs})
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+    )
+
+# --- PARITY CHECK ---
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def _doc_key(doc):
+    return (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content[:80])
+
+def load_benchmark_queries(path=BENCHMARK_QUERIES):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def parity_check(candidate=None, baseline="torch", k=5, db_path=DB_PATH):
+    """
+    Compare a candidate backend with the PyTorch baseline on the benchmark queries:
+    embedding cosine, top-k overlap against the existing index, and latency.
+    Returns True when both tolerances hold.
+    """
+    from langchain_chroma import Chroma
+    from index_maintenance import collection_metadata
+
+    candidate = candidate or EMBEDDING_BACKEND
+    queries = load_benchmark_queries()
+    base_model = get_embeddings(baseline)
+    cand_model = get_embeddings(candidate)
+    vector_db = Chroma(persist_directory=db_path, embedding_function=base_model, collection_metadata=collection_metadata(db_path))
+
+    timings = {}
+    vectors = {}
+    for name, model in ((baseline, base_model), (candidate, cand_model)):
+        model.embed_query("warm up")
+        start = time.perf_counter()
+        vectors[name] = [model.embed_query(q) for q in queries]
+        per_query = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        model.embed_documents(queries * 8)
+        throughput = len(queries) * 8 / (time.perf_counter() - start)
+        timings[name] = (per_query * 1000, throughput)
+
+    cosines = []
+    overlaps = []
+    for query, base_vec, cand_vec in zip(queries, vectors[baseline], vectors[candidate]):
+        base_top = {_doc_key(d) for d in vector_db.similarity_search_by_vector(base_vec, k=k)}
+        cand_top = {_doc_key(d) for d in vector_db.similarity_search_by_vector(cand_vec, k=k)}
+        cosines.append(_cosine(base_vec, cand_vec))
+        overlaps.append(len(base_top & cand_top) / k)
+        if overlaps[-1] < 1.0:
+            print(f"   ↪ overlap {overlaps[-1]:.0%}: {query}")
+
+    print(f"📏 Parity: {candidate} vs {baseline} on {len(queries)} queries (k={k})")
+    for name, (latency_ms, throughput) in timings.items():
+        print(f"   -> {name:10s} {latency_ms:7.1f} ms/query   {throughput:7.1f} texts/s batched")
+    print(f"   -> min cosine {min(cosines):.4f}   mean top-{k} overlap {sum(overlaps) / len(overlaps):.2%}")
+
+    ok = min(cosines) >= PARITY_MIN_COSINE and sum(overlaps) / len(overlaps) >= PARITY_MIN_OVERLAP
+    print("✅ Within tolerance." if ok else "❌ Outside tolerance: keep the torch backend.")
+    return ok
+
+if __name__ == "__main__":
+    # Usage: python embedding_backends.py [onnx|onnx-int8]
+    sys.exit(0 if parity_check(sys.argv[1] if len(sys.argv) > 1 else None) else 1)
@@ -0,0 +1,387 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import tarfile
+import hashlib
+import datetime
+import tempfile
+import contextlib
+import requests
+from embedding_backends import EMBEDDING_MODEL, EMBEDDING_BACKEND
+
+# --- CONFIGURATION ---
+DB_PATH = "vector_db"
+QUANTIZED_PATH = os.getenv("QUANTIZED_STORE_PATH", "vector_store_q8")
+INDEX_DIRS = [DB_PATH, QUANTIZED_PATH]  # Packaged when present; citation_index.json lives in vector_db
+DATA_FOLDER = "source_docs"
+PUBLISH_DIR = os.getenv("INDEX_PUBLISH_DIR", "index_artifacts")
+PUBLISH_URL = os.getenv("INDEX_PUBLISH_URL")  # Optional HTTP PUT target (e.g. a pre-authorised bucket prefix)
+MANIFEST_NAME = "manifest.json"
+INSTALLED_MANIFEST = os.path.join(DB_PATH, "artifact_manifest.json")  # Written on install, never packaged
+INDEX_META_PATH = os.path.join(DB_PATH, "index_meta.json")
+INSTALL_LOCK = ".index_install.lock"  # Serialises installs between app workers on one box
+FORMAT_VERSION = 1
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _index_files(root="."):
+    """{relative path: {sha256, size}} for every file of every index directory present."""
+    files = {}
+    for index_dir in INDEX_DIRS:
+        base = os.path.join(root, index_dir)
+        for folder, _, names in os.walk(base):
+            for name in names:
+                path = os.path.join(folder, name)
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                if rel == INSTALLED_MANIFEST.replace(os.sep, "/"):
+                    continue
+                files[rel] = {"sha256": _sha256(path), "size": os.path.getsize(path)}
+    return files
+
+def _index_meta():
+    """What ingest_data.py recorded about this build; doc hashes are recomputed if it is missing."""
+    if os.path.exists(INDEX_META_PATH):
+        with open(INDEX_META_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    from page_store import file_hash
+    pdfs = sorted(f for f in os.listdir(DATA_FOLDER) if f.endswith(".pdf")) if os.path.exists(DATA_FOLDER) else []
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "chunker_version": None,
+        "documents": {f: file_hash(os.path.join(DATA_FOLDER, f)) for f in pdfs},
+    }
+
+def _doc_member(name):
+    return f"{DATA_FOLDER}/{name}"
+
+# --- PACKAGING ---
+def build_artifact(out_dir=PUBLISH_DIR, base_manifest=None, version=None):
+    """
+    Package the built index as <version>.tar.gz plus a side-car manifest. With `base_manifest`
+    the archive only carries files that changed since that version (a delta); the manifest
+    still lists the full file set so the installed result can be verified end to end.
+    Source PDFs travel too (new or changed ones by doc hash), so the Verification Deck can
+    render pages on nodes that never ran the harvester.
+    """
+    if not os.path.exists(DB_PATH):
+        raise FileNotFoundError(f"❌ No index at '{DB_PATH}'. Run ingest_data.py first.")
+
+    files = _index_files()
+    meta = _index_meta()
+    if os.path.exists(QUANTIZED_PATH):
+        from quantized_store import stale_reason
+        stale = stale_reason(QUANTIZED_PATH, DB_PATH)
+        if stale:
+            raise ValueError(f"❌ Refusing to package a stale quantized store: {stale}. Run: python quantized_store.py migrate")
+    version = version or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    if base_manifest:
+        included = [p for p, f in files.items() if base_manifest["files"].get(p, {}).get("sha256") != f["sha256"]]
+        removed = [p for p in base_manifest["files"] if p not in files]
+    else:
+        included, removed = list(files), []
+
+    documents = meta.get("documents", {})
+    base_documents = base_manifest.get("documents", {}) if base_manifest else {}
+    included_documents = []
+    for name, digest in documents.items():
+        path = os.path.join(DATA_FOLDER, name)
+        if base_documents.get(name) == digest:
+            continue
+        if not os.path.exists(path) or _sha256(path) != digest:
+            print(f"⚠️ {name} is missing or changed since ingest; not packaged")
+            continue
+        included_documents.append(name)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "embedding_model": meta["embedding_model"],
+        "embedding_backend": meta.get("embedding_backend"),
+        "chunker_version": meta.get("chunker_version"),
+        "documents": documents,
+        "base_version": base_manifest["version"] if base_manifest else None,
+        "files": files,
+        "included": sorted(included),
+        "removed": sorted(removed),
+        "included_documents": sorted(included_documents),
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    kind = "delta" if base_manifest else "full"
+    archive_path = os.path.join(out_dir, f"index-{version}-{kind}.tar.gz")
+    tmp_path = f"{archive_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz", compresslevel=6) as tar:
+        data = json.dumps(manifest, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size, info.mtime = len(data), int(time.time())
+        tar.addfile(info, io.BytesIO(data))  # First member, so loaders can check it before extracting
+        for rel in manifest["included"]:
+            tar.add(rel, arcname=rel, recursive=False)
+        for name in manifest["included_documents"]:
+            tar.add(os.path.join(DATA_FOLDER, name), arcname=_doc_member(name), recursive=False)
+    os.replace(tmp_path, archive_path)
+
+    manifest["archive"] = os.path.basename(archive_path)
+    manifest["archive_sha256"] = _sha256(archive_path)
+    with open(f"{archive_path[:-len('.tar.gz')]}.manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    size_mb = os.path.getsize(archive_path) / 1e6
+    print(f"📦 {kind.title()} artifact {version}: {len(included)} files, {len(removed)} removed, "
+          f"{len(included_documents)} source PDFs, {size_mb:.1f} MB -> {archive_path}")
+    return archive_path, manifest
+
+def publish(out_dir=PUBLISH_DIR, upload_url=PUBLISH_URL):
+    """
+    Build a full artifact (plus a delta against the previous release) and point latest.json
+    at them. App nodes install from <publish location>/latest.json.
+    """
+    latest_path = os.path.join(out_dir, "latest.json")
+    previous = None
+    if os.path.exists(latest_path):
+        with open(latest_path, "r", encoding="utf-8") as f:
+            previous_full = json.load(f)["full"]
+        with open(os.path.join(out_dir, previous_full.replace(".tar.gz", ".manifest.json")), "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    full_path, manifest = build_artifact(out_dir)
+    latest = {"version": manifest["version"], "full": os.path.basename(full_path), "full_sha256": manifest["archive_sha256"]}
+    if previous and previous["embedding_model"] == manifest["embedding_model"]:
+        # Same version as the full artifact: either path leaves a node on identical files
+        delta_path, delta = build_artifact(out_dir, base_manifest=previous, version=manifest["version"])
+        latest.update(delta=os.path.basename(delta_path), delta_sha256=delta["archive_sha256"], delta_base=previous["version"])
+
+    with open(f"{latest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(latest, f, indent=2)
+    os.replace(f"{latest_path}.tmp", latest_path)
+    # The builder already runs this version; without the marker ensure_index would reinstall it
+    with open(INSTALLED_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if upload_url:
+        names = [latest["full"], latest["full"].replace(".tar.gz", ".manifest.json")]
+        if "delta" in latest:
+            names += [latest["delta"], latest["delta"].replace(".tar.gz", ".manifest.json")]
+        for name in names + ["latest.json"]:  # latest.json last, so it never points at a missing file
+            with open(os.path.join(out_dir, name), "rb") as f:
+                requests.put(f"{upload_url.rstrip('/')}/{name}", data=f, timeout=600).raise_for_status()
+    return latest
+
+# --- LOADING ---
+def _fetch(source, dest_dir):
+    """Local path or http(s) URL -> local file path (streamed to disk, never held in memory)."""
+    if not source.startswith(("http://", "https://")):
+        return source
+    path = os.path.join(dest_dir, os.path.basename(source.split("?", 1)[0]))
+    with requests.get(source, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(1 << 20):
+                f.write(chunk)
+    return path
+
+def _sibling(source, name):
+    return f"{source.rsplit('/', 1)[0]}/{name}" if "/" in source else name
+
+def installed_manifest(root="."):
+    path = os.path.join(root, INSTALLED_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _verify_member(tar, member, expected):
+    if member.name not in expected or not member.isfile():
+        raise ValueError(f"❌ Unexpected artifact member '{member.name}'")
+    digest = hashlib.sha256()
+    with tar.extractfile(member) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    if digest.hexdigest() != expected[member.name]["sha256"]:
+        raise ValueError(f"❌ Checksum mismatch for '{member.name}'")
+
+def install_artifact(source, root=".", expected_sha256=None):
+    """
+    Verify an artifact and swap it in. Every file is checked against the manifest before the
+    live directories are touched; each index directory is then replaced with one rename.
+    Deltas are applied on top of a copy of the installed version they were built against.
+    Source PDFs are added to DATA_FOLDER (never removed) before the index is swapped in.
+    Callers that can race (app workers) go through install_locked().
+    """
+    with tempfile.TemporaryDirectory(dir=root) as work:
+        archive = _fetch(source, work)
+        if expected_sha256 and _sha256(archive) != expected_sha256:
+            raise ValueError(f"❌ Artifact checksum mismatch: {source}")
+
+        with tarfile.open(archive, "r:gz") as tar:
+            manifest = json.load(tar.extractfile(MANIFEST_NAME))
+            if manifest["format"] != FORMAT_VERSION:
+                raise ValueError(f"❌ Unsupported artifact format {manifest['format']}")
+            if manifest["embedding_model"] != EMBEDDING_MODEL:
+                raise ValueError(f"❌ Artifact was built with {manifest['embedding_model']}, app uses {EMBEDDING_MODEL}")
+
+            current = installed_manifest(root)
+            if manifest["base_version"] and (current is None or current["version"] != manifest["base_version"]):
+                raise ValueError(f"❌ Delta needs installed version {manifest['base_version']}")
+
+            staging = os.path.join(work, "staging")
+            dirs = sorted({p.split("/", 1)[0] for p in list(manifest["files"]) + manifest["removed"]})
+            if manifest["base_version"]:
+                for d in dirs:
+                    if os.path.exists(os.path.join(root, d)):
+                        shutil.copytree(os.path.join(root, d), os.path.join(staging, d))
+                for rel in manifest["removed"]:
+                    if os.path.exists(os.path.join(staging, rel)):
+                        os.remove(os.path.join(staging, rel))
+
+            expected_documents = {_doc_member(n): {"sha256": h} for n, h in manifest.get("documents", {}).items()}
+            staged_documents = os.path.join(work, "documents")
+            for member in tar.getmembers():
+                if member.name == MANIFEST_NAME:
+                    continue
+                if member.name.startswith(f"{DATA_FOLDER}/"):
+                    _verify_member(tar, member, expected_documents)
+                    tar.extract(member, staged_documents, filter="data")
+                    continue
+                _verify_member(tar, member, manifest["files"])
+                tar.extract(member, staging, filter="data")
+
+        # The staged tree must match the manifest exactly (catches a bad base for deltas)
+        staged = {}
+        for d in dirs:
+            for folder, _, names in os.walk(os.path.join(staging, d)):
+                for name in names:
+                    path = os.path.join(folder, name)
+                    rel = os.path.relpath(path, staging).replace(os.sep, "/")
+                    if rel != INSTALLED_MANIFEST.replace(os.sep, "/"):
+                        staged[rel] = _sha256(path)
+        if staged != {p: f["sha256"] for p, f in manifest["files"].items()}:
+            raise ValueError("❌ Installed files do not match the artifact manifest")
+
+        with open(os.path.join(staging, INSTALLED_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in manifest.items() if k != "included"}, f, indent=2)
+
+        # PDFs first, so the new index never cites a page this node can't render
+        os.makedirs(os.path.join(root, DATA_FOLDER), exist_ok=True)
+        for name in manifest.get("included_documents", []):
+            os.replace(os.path.join(staged_documents, DATA_FOLDER, name), os.path.join(root, DATA_FOLDER, name))
+
+        for d in dirs:
+            live, old = os.path.join(root, d), os.path.join(work, f"{d}.old")
+            if os.path.exists(live):
+                os.replace(live, old)
+            os.replace(os.path.join(staging, d), live)
+
+    print(f"✅ Installed index {manifest['version']} ({len(manifest['files'])} files, chunker {manifest['chunker_version']}).")
+    return manifest
+
+def install_latest(latest_source, root="."):
+    """Follow latest.json: apply the delta when this node is on its base, else the full artifact."""
+    with tempfile.TemporaryDirectory() as work:
+        with open(_fetch(latest_source, work), "r", encoding="utf-8") as f:
+            latest = json.load(f)
+    current = installed_manifest(root)
+    if current and current["version"] == latest["version"]:
+        print(f"✅ Index {current['version']} is already the latest.")
+        return current
+    if current and latest.get("delta_base") == current["version"]:
+        try:
+            return install_artifact(_sibling(latest_source, latest["delta"]), root, latest["delta_sha256"])
+        except ValueError as e:
+            print(f"⚠️ Delta install failed ({e}), falling back to the full artifact.")
+    return install_artifact(_sibling(latest_source, latest["full"]), root, latest["full_sha256"])
+
+@contextlib.contextmanager
+def _install_lock(root="."):
+    """Exclusive cross-process lock on a file next to the index (fcntl on Linux, msvcrt on Windows)."""
+    with open(os.path.join(root, INSTALL_LOCK), "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s; keep waiting for the other worker
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def install_locked(source, root="."):
+    """install_latest/install_artifact under the install lock."""
+    with _install_lock(root):
+        if source.endswith(".json"):
+            return install_latest(source, root)
+        return install_artifact(source, root)
+
+def _published_version(source):
+    """Version named by latest.json, or None for a pinned .tar.gz (which never changes under us)."""
+    if not source.endswith(".json"):
+        return None
+    with tempfile.TemporaryDirectory() as work:
+        with open(_fetch(source, work), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+
+def _needs_install(current, published):
+    if current is None:
+        return True  # No index, or one that didn't come from an artifact (e.g. a stale git checkout)
+    return published is not None and current["version"] != published
+
+def ensure_index(source, root="."):
+    """
+    Install the published index unless this node already runs that version. Never re-ingests.
+    The decision uses the installed artifact manifest, not the presence of vector_db/, so a
+    checkout that carries an old index still picks up the published one.
+    """
+    if not source:
+        return None
+    current = installed_manifest(root)
+    try:
+        published = _published_version(source)
+    except (OSError, ValueError, KeyError, requests.RequestException) as e:
+        if current is None:
+            raise
+        print(f"⚠️ Could not check {source} ({e}); serving installed index {current['version']}")
+        return current
+    if not _needs_install(current, published):
+        return current
+    with _install_lock(root):
+        # Every Streamlit worker gets here on a fresh replica; only the first one downloads
+        current = installed_manifest(root)
+        if not _needs_install(current, published):
+            return current
+        print(f"📥 Installing published index {published or source} (local: {current['version'] if current else 'none'})...")
+        if source.endswith(".json"):
+            return install_latest(source, root)
+        return install_artifact(source, root)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "publish"
+    if command == "publish":
+        publish()
+    elif command == "build":
+        build_artifact()
+    elif command == "install" and len(sys.argv) > 2:
+        install_locked(sys.argv[2])
+    else:
+        print("Usage: python index_artifacts.py [publish | build | install <artifact.tar.gz | latest.json>]")
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+from collections import Counter
+
+# --- CONFIGURATION ---
+DB_PATH = "vector_db"
+CONFIG_NAME = "index_config.json"  # Lives inside vector_db so it ships with index artifacts
+SQLITE_NAME = "chroma.sqlite3"
+FETCH_BATCH = 2000
+SWEEP_K = 5
+SWEEP_TARGET_RECALL = float(os.getenv("SWEEP_TARGET_RECALL", "0.95"))
+SWEEP_M = [8, 16, 32]
+SWEEP_EF_SEARCH = [10, 20, 40, 80, 160]
+
+# Chroma's own defaults, so an index built before this file existed is described correctly
+DEFAULT_CONFIG = {"space": "l2", "max_neighbors": 16, "ef_construction": 100, "ef_search": 100}
+
+# --- CONFIG ---
+def _config_path(db_path=DB_PATH):
+    return os.path.join(db_path, CONFIG_NAME)
+
+def load_index_config(db_path=DB_PATH):
+    config = dict(DEFAULT_CONFIG)
+    path = _config_path(db_path)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f)["hnsw"])
+    return config
+
+def save_index_config(config, db_path=DB_PATH, note=None):
+    os.makedirs(db_path, exist_ok=True)
+    payload = {"hnsw": {k: config[k] for k in DEFAULT_CONFIG}, "updated": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if note:
+        payload["note"] = note
+    with open(f"{_config_path(db_path)}.tmp", "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(f"{_config_path(db_path)}.tmp", _config_path(db_path))
+
+def collection_metadata(db_path=DB_PATH):
+    """HNSW settings as Chroma collection metadata. Pass as `collection_metadata=` wherever vector_db is opened."""
+    config = load_index_config(db_path)
+    return {
+        "hnsw:space": config["space"],
+        "hnsw:M": config["max_neighbors"],
+        "hnsw:construction_ef": config["ef_construction"],
+        "hnsw:search_ef": config["ef_search"],
+    }
+
+# --- INSPECTION ---
+def _client(db_path=DB_PATH):
+    import chromadb  # Only the maintenance commands need the raw client
+    return chromadb.PersistentClient(path=db_path)
+
+def _iter_records(collection, include):
+    total = collection.count()
+    for offset in range(0, total, FETCH_BATCH):
+        yield collection.get(include=include, limit=FETCH_BATCH, offset=offset)
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+def _sqlite_stats(db_path=DB_PATH):
+    path = os.path.join(db_path, SQLITE_NAME)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        queue = conn.execute("SELECT COUNT(*) FROM embeddings_queue").fetchone()[0] if "embeddings_queue" in tables else None
+        segments = {row[0] for row in conn.execute("SELECT id FROM segments")} if "segments" in tables else set()
+    finally:
+        conn.close()
+    return {"size_mb": round(os.path.getsize(path) / 1e6, 2), "reclaimable_mb": round(page_size * free_pages / 1e6, 2), "embeddings_queue_rows": queue}, segments
+
+def _orphan_segment_dirs(db_path, segments):
+    """HNSW segment directories that no collection references any more (left by deletions)."""
+    return [d for d in os.listdir(db_path) if os.path.isdir(os.path.join(db_path, d)) and d not in segments]
+
+def index_stats(db_path=DB_PATH):
+    """Collection sizes, duplicate chunks, per-source counts, disk usage and HNSW settings."""
+    client = _client(db_path)
+    sqlite_stats, segments = _sqlite_stats(db_path)
+    report = {
+        "path": db_path,
+        "disk_mb": round(_dir_size(db_path) / 1e6, 2),
+        "sqlite": sqlite_stats,
+        "orphan_segment_dirs": _orphan_segment_dirs(db_path, segments),
+        "configured": load_index_config(db_path),
+        "collections": [],
+    }
+    for collection in client.list_collections():
+        hashes, sources = Counter(), Counter()
+        for batch in _iter_records(collection, ["documents", "metadatas"]):
+            for text, metadata in zip(batch["documents"], batch["metadatas"]):
+                hashes[hashlib.sha1((text or "").encode("utf-8")).hexdigest()] += 1
+                sources[os.path.basename(str((metadata or {}).get("source", "?")).replace("\\", "/"))] += 1
+        hnsw = (collection.configuration or {}).get("hnsw") or {}
+        report["collections"].append({
+            "name": collection.name,
+            "count": collection.count(),
+            "duplicate_chunks": sum(n - 1 for n in hashes.values() if n > 1),
+            "sources": len(sources),
+            "top_sources": sources.most_common(5),
+            "hnsw": {k: hnsw.get(k) for k in DEFAULT_CONFIG},
+        })
+    return report
+
+def print_stats(report):
+    print(f"📊 {report['path']}: {report['disk_mb']} MB on disk, SQLite {report['sqlite']['size_mb']} MB "
+          f"({report['sqlite']['reclaimable_mb']} MB reclaimable, {report['sqlite']['embeddings_queue_rows']} queued embeddings)")
+    if report["orphan_segment_dirs"]:
+        print(f"   ⚠️ {len(report['orphan_segment_dirs'])} orphaned segment directories (run `compact`)")
+    print(f"   Configured HNSW: {report['configured']}")
+    for c in report["collections"]:
+        print(f"   • {c['name']}: {c['count']} chunks from {c['sources']} sources, {c['duplicate_chunks']} duplicates")
+        print(f"     HNSW in use: {c['hnsw']}")
+        for source, n in c["top_sources"]:
+            print(f"       {n:>6}  {source}")
+        if any(c["hnsw"][k] not in (None, report["configured"][k]) for k in ("max_neighbors", "ef_construction", "space")):
+            print("     ⚠️ Graph built with different settings than index_config.json (run `rebuild`)")
+
+# --- COMPACTION ---
+def compact(db_path=DB_PATH):
+    """VACUUM the SQLite store and delete orphaned segment directories. Run with the app stopped."""
+    before = _dir_size(db_path)
+    _, segments = _sqlite_stats(db_path)
+    for d in _orphan_segment_dirs(db_path, segments):
+        shutil.rmtree(os.path.join(db_path, d))
+        print(f"   🗑️ Removed orphaned segment {d}")
+    conn = sqlite3.connect(os.path.join(db_path, SQLITE_NAME))
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    after = _dir_size(db_path)
+    print(f"✅ Compacted {db_path}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+# --- REBUILD ---
+def _copy_collection(source, client, name, config):
+    from chromadb.api.collection_configuration import CreateCollectionConfiguration
+    target = client.create_collection(
+        name=name,
+        metadata={k: v for k, v in (source.metadata or {}).items() if not k.startswith("hnsw:")} or None,
+        configuration=CreateCollectionConfiguration(hnsw={k: config[k] for k in DEFAULT_CONFIG}),
+    )
+    for records in _iter_records(source, ["documents", "metadatas", "embeddings"]):
+        for i in range(0, len(records["ids"]), client.get_max_batch_size()):
+            sl = slice(i, i + client.get_max_batch_size())
+            target.add(ids=records["ids"][sl], embeddings=records["embeddings"][sl],
+                       documents=records["documents"][sl], metadatas=records["metadatas"][sl])
+    return target
+
+def rebuild(db_path=DB_PATH, config=None):
+    """
+    Rebuild every collection's HNSW graph with `config` (default: index_config.json) into a
+    fresh directory, copying stored embeddings (no re-embedding), then swap it in.
+    """
+    config = config or load_index_config(db_path)
+    staging, old = f"{db_path}.rebuild", f"{db_path}.old"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    source_client = _client(db_path)
+    target_client = _client(staging)
+    for collection in source_client.list_collections():
+        print(f"🔧 Rebuilding '{collection.name}' ({collection.count()} chunks) with {config}...")
+        target = _copy_collection(collection, target_client, collection.name, config)
+        if target.count() != collection.count():
+            raise RuntimeError(f"❌ Rebuild of '{collection.name}' copied {target.count()} of {collection.count()} chunks")
+
+    # Sidecar files (citation index, ingest metadata, artifact manifest) move with the index
+    for name in os.listdir(db_path):
+        path = os.path.join(db_path, name)
+        if os.path.isfile(path) and name != SQLITE_NAME and not os.path.exists(os.path.join(staging, name)):
+            shutil.copy2(path, os.path.join(staging, name))
+    save_index_config(config, staging, note="rebuild")
+
+    shutil.rmtree(old, ignore_errors=True)
+    os.replace(db_path, old)
+    os.replace(staging, db_path)
+    shutil.rmtree(old)
+    print(f"✅ Rebuilt {db_path} ({_dir_size(db_path) / 1e6:.1f} MB)")
+
+# --- PARAMETER SWEEP ---
+def _exact_neighbours(matrix, queries, space, k):
+    import numpy as np
+    if space == "cosine":
+        matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        scores = -(queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ matrix.T
+    elif space == "ip":
+        scores = -(queries @ matrix.T)
+    else:
+        scores = (queries ** 2).sum(1)[:, None] - 2 * queries @ matrix.T + (matrix ** 2).sum(1)[None, :]
+    return np.argsort(scores, axis=1)[:, :k]
+
+def sweep(db_path=DB_PATH, collection_name=None, target_recall=SWEEP_TARGET_RECALL, k=SWEEP_K,
+          m_values=SWEEP_M, ef_values=SWEEP_EF_SEARCH, save=True):
+    """
+    Recall@k and latency of each (M, ef_search) on the benchmark queries, measured against
+    exact search over the stored embeddings. The fastest setting reaching `target_recall` is
+    saved to index_config.json (ef_search is applied to the live index; a new M needs `rebuild`).
+    """
+    import numpy as np
+    from chromadb.api.collection_configuration import UpdateCollectionConfiguration
+    from embedding_backends import get_embeddings, load_benchmark_queries
+
+    client = _client(db_path)
+    source = client.get_collection(collection_name) if collection_name else client.list_collections()[0]
+    config = load_index_config(db_path)
+    ids, vectors = [], []
+    for records in _iter_records(source, ["embeddings"]):
+        ids.extend(records["ids"])
+        vectors.extend(records["embeddings"])
+    matrix = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(get_embeddings().embed_documents(load_benchmark_queries()), dtype=np.float32)
+    truth = [{ids[j] for j in row} for row in _exact_neighbours(matrix, queries, config["space"], k)]
+    print(f"🎯 Sweeping {source.name}: {len(ids)} vectors, {len(queries)} queries, recall@{k} target {target_recall}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as work:
+        sweep_client = _client(work)
+        for m in m_values:
+            trial_config = dict(config, max_neighbors=m)
+            build_start = time.perf_counter()
+            trial = _copy_collection(source, sweep_client, f"sweep_m{m}", trial_config)
+            build_s = time.perf_counter() - build_start
+            for ef in ef_values:
+                trial.modify(configuration=UpdateCollectionConfiguration(hnsw={"ef_search": ef}))
+                trial.query(query_embeddings=queries[:1].tolist(), n_results=k)  # Warm the index
+                latencies, hits = [], 0
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    found = trial.query(query_embeddings=[query.tolist()], n_results=k, include=[])["ids"][0]
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += len(expected & set(found))
+                latencies.sort()
+                row = {
+                    "max_neighbors": m, "ef_search": ef,
+                    f"recall@{k}": round(hits / (k * len(queries)), 3),
+                    "mean_ms": round(sum(latencies) / len(latencies), 2),
+                    "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+                    "build_s": round(build_s, 1),
+                }
+                results.append(row)
+                print(f"   M={m:<3} ef_search={ef:<4} recall {row[f'recall@{k}']:.3f}  mean {row['mean_ms']} ms  p95 {row['p95_ms']} ms")
+
+    passing = [r for r in results if r[f"recall@{k}"] >= target_recall]
+    if not passing:
+        print(f"⚠️ No setting reached recall {target_recall}; keeping {config}")
+        return results, None
+    best = min(passing, key=lambda r: (r["mean_ms"], r["max_neighbors"], r["ef_search"]))
+    chosen = dict(config, max_neighbors=best["max_neighbors"], ef_search=best["ef_search"])
+    print(f"🏆 M={best['max_neighbors']}, ef_search={best['ef_search']}: recall {best[f'recall@{k}']} at {best['mean_ms']} ms")
+
+    if save:
+        save_index_config(chosen, db_path, note=f"sweep: recall@{k} {best[f'recall@{k}']} >= {target_recall}")
+        for collection in client.list_collections():
+            collection.modify(configuration=UpdateCollectionConfiguration(hnsw={"ef_search": chosen["ef_search"]}))
+        if chosen["max_neighbors"] != config["max_neighbors"]:
+            print("   ℹ️ M changed: run `python index_maintenance.py rebuild` to apply it to the live index.")
+    return results, chosen
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        print_stats(index_stats())
+    elif command == "compact":
+        compact()
+    elif command == "rebuild":
+        rebuild()
+    elif command == "sweep":
+        sweep(target_recall=float(sys.argv[2]) if len(sys.argv) > 2 else SWEEP_TARGET_RECALL)
+    else:
+        print("Usage: python index_maintenance.py [stats | compact | rebuild | sweep [target_recall]]")
@@ -1,9 +1,14 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
+import json
+import uuid
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-# Updated import to fix the warning you saw
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
+from embedding_backends import get_embeddings, EMBEDDING_MODEL, EMBEDDING_BACKEND
+from page_store import load_documents
+from ocr_stage import run_ocr_stage
+from citation_index import build_citation_index
+from index_maintenance import load_index_config, save_index_config, collection_metadata
+from quantized_store import STORE_PATH, migrate_from_chroma
 import sys
 import io
 
@@ -15,6 +20,8 @@ sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 # Configuration
 DATA_FOLDER = "source_docs"
 DB_PATH = "vector_db"
+CHUNKER_VERSION = "recursive-1000-200-v1"  # Bump whenever the splitter settings below change
+INDEX_META_PATH = os.path.join(DB_PATH, "index_meta.json")  # Read by index_artifacts.py
 
 def ingest_pdfs():
     # 1. Check if folder exists
@@ -30,7 +37,11 @@ def ingest_pdfs():
 
     print(f"📚 Found {len(pdf_files)} PDFs...")
 
+    # Scanned judgments have no text layer: OCR those pages once (cached by file hash + page)
+    run_ocr_stage([os.path.join(DATA_FOLDER, f) for f in pdf_files])
+
     all_chunks = []
+    doc_hashes = {}
 
     # 3. Process each PDF
     for pdf_file in pdf_files:
@@ -38,8 +49,10 @@ def ingest_pdfs():
         print(f"Processing {pdf_file}...")
         
         try:
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
+            # Page text comes from the persistent page store; PDFs are only parsed the first time
+            documents = load_documents(pdf_path)
+            if documents:
+                doc_hashes[pdf_file] = documents[0].metadata["file_hash"]
             
             # Split Text
             text_splitter = RecursiveCharacterTextSplitter(
@@ -57,17 +70,20 @@ def ingest_pdfs():
     print(f"🧠 Embeddings {len(all_chunks)} total chunks (Processing in batches)...")
     
     # 4. Create/Reset Vector DB
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = get_embeddings()  # Same backend as query time (see embedding_backends.py)
     
+    index_config = load_index_config(DB_PATH)  # Tuned HNSW settings survive the reset below
     if os.path.exists(DB_PATH):
         import shutil
         shutil.rmtree(DB_PATH)
         print("   -> Cleared old database.")
+    save_index_config(index_config, DB_PATH)
 
     # Initialize DB
     vector_db = Chroma(
         persist_directory=DB_PATH,
-        embedding_function=embeddings
+        embedding_function=embeddings,
+        collection_metadata=collection_metadata(DB_PATH)
     )
 
     # 5. Batch Insert (The Fix!)
@@ -80,6 +96,23 @@ def ingest_pdfs():
         print(f"   -> Inserting batch {i//BATCH_SIZE + 1}/{total_batches} ({len(batch)} chunks)...")
         vector_db.add_documents(documents=batch)
 
+    # 6. Exact citation index (act, section) -> provision, for the fast path in app_logic
+    build_citation_index()
+
+    # 7. What this index was built from, so packaged artifacts can be checked against the app
+    with open(INDEX_META_PATH, "w", encoding="utf-8") as f:
+        json.dump({
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "chunker_version": CHUNKER_VERSION,
+            "documents": doc_hashes,
+            "build_id": uuid.uuid4().hex,  # The quantized store records which build it mirrors
+        }, f, indent=2)
+
+    # 8. Nodes on VECTOR_BACKEND=quantized read a copy of this index; rebuild it or they serve the old corpus
+    if os.path.exists(STORE_PATH):
+        migrate_from_chroma(DB_PATH)
+
     print(f"✅ Success! Knowledge Base updated with {len(all_chunks)} chunks.")
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import csv
+import math
+import threading
+from collections import defaultdict
+
+# --- CONFIGURATION ---
+EXAMPLES_PATH = "data/intent_examples.csv"  # label,text rows; add examples here to retrain
+INTENTS = ("research", "draft", "convert")
+TOP_K = 5
+MIN_CONFIDENCE = 0.5  # Below this we fall back to research (the cheapest safe route)
+
+def _normalize(vector):
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def _dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+def load_examples(path=EXAMPLES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [(row["label"].strip(), row["text"].strip()) for row in csv.DictReader(f)]
+    unknown = {label for label, _ in rows} - set(INTENTS)
+    if unknown:
+        raise ValueError(f"❌ Unknown intent labels in {path}: {sorted(unknown)}")
+    return rows
+
+class IntentClassifier:
+    """
+    Routes a chat turn to research / draft / convert without an LLM call.
+    Similarity-weighted k-nearest-neighbours over the labeled examples,
+    embedded once with the same MiniLM model the retriever uses.
+    """
+
+    def __init__(self, embeddings, examples_path=EXAMPLES_PATH, k=TOP_K):
+        self.embeddings = embeddings
+        self.examples_path = examples_path
+        self.k = k
+        self.labels = []
+        self.vectors = []
+        self._lock = threading.Lock()
+
+    def _fit(self):
+        with self._lock:
+            if self.vectors:
+                return
+            examples = load_examples(self.examples_path)
+            vectors = self.embeddings.embed_documents([text for _, text in examples])
+            self.labels = [label for label, _ in examples]
+            self.vectors = [_normalize(v) for v in vectors]
+
+    def classify(self, text):
+        """Returns (intent, confidence) where confidence is the winning share of neighbour similarity."""
+        self._fit()
+        query = _normalize(self.embeddings.embed_query(text))
+        scored = sorted(((_dot(query, v), label) for v, label in zip(self.vectors, self.labels)), reverse=True)
+
+        votes = defaultdict(float)
+        for score, label in scored[:self.k]:
+            votes[label] += max(score, 0.0)
+        total = sum(votes.values())
+        if not total:
+            return "research", 0.0
+
+        intent, weight = max(votes.items(), key=lambda item: item[1])
+        confidence = weight / total
+        if confidence < MIN_CONFIDENCE:
+            return "research", confidence
+        return intent, confidence
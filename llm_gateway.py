@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+# --- CONFIGURATION (Defaults match the Groq on-demand tier for llama-3.3-70b) ---
+MODEL_NAME = "llama-3.3-70b-versatile"
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# The provider quota is per API key, but buckets are per process: split it across the app workers
+LLM_WORKERS = max(1, int(os.getenv("LLM_WORKERS", "1")))
+REQUESTS_PER_MINUTE = max(1, int(os.getenv("LLM_RPM", "30")) // LLM_WORKERS)
+TOKENS_PER_MINUTE = max(1, int(os.getenv("LLM_TPM", "12000")) // LLM_WORKERS)
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT_S", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+HEDGE_AFTER_MS = int(os.getenv("LLM_HEDGE_AFTER_MS", "0"))  # 0 = hedging off
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError", "ConnectionError"}
+
+_current_user = contextvars.ContextVar("jurisone_llm_user", default="anonymous")
+
+# --- RATE LIMITING ---
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to `capacity`. Callers block in acquire()."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # A single huge prompt must not wait forever
+        while True:
+            with self.lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                wait_s = (amount - self.level) / self.rate
+            time.sleep(min(wait_s, 1.0))
+
+    def try_acquire(self, amount=1):
+        """acquire() without waiting: False when the bucket can't cover `amount` right now."""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.level >= amount:
+                self.level -= amount
+                return True
+            return False
+
+    def debit(self, amount):
+        """Charge usage discovered after the call (e.g. completion tokens) without blocking."""
+        with self.lock:
+            self._refill()
+            self.level -= amount
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+# --- BACKENDS ---
+class GroqBackend:
+    """The production backend. Retries are disabled here because the gateway owns them."""
+
+    def __init__(self, api_key, model_name=MODEL_NAME, temperature=0.1, timeout=REQUEST_TIMEOUT):
+        from langchain_groq import ChatGroq
+        self.client = ChatGroq(temperature=temperature, model_name=model_name, api_key=api_key, timeout=timeout, max_retries=0)
+
+    def invoke(self, prompt):
+        return self.client.invoke(prompt)
+
+class FakeBackend:
+    """Offline stand-in for tests and load runs. Sleeps `latency_ms` (+/- jitter) and answers from `responder`."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, fail_rate=0.0, responder=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.responder = responder or default_fake_response
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+        if random.random() < self.fail_rate:
+            raise TimeoutError("Fake backend timeout")
+        content = self.responder(text)
+        usage = {"input_tokens": estimate_tokens(text), "output_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=content, usage_metadata=usage)
+
+def default_fake_response(prompt_text):
+    if "OUTPUT JSON ONLY" in prompt_text:
+        return json.dumps({"status": "READY", "missing_details": [], "document_type": "Legal Notice", "draft": "FAKE DRAFT"})
+    if "OUTPUT ONLY THE SEARCH QUERY" in prompt_text:
+        return "Fake search query"
+    return "FAKE RESPONSE"
+
+# --- GATEWAY ---
+class LLMGateway:
+    """
+    Every LLM call goes through here: bounded concurrency, RPM/TPM token buckets,
+    jittered exponential backoff on retryable errors, optional hedging and per-user accounting.
+    """
+
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_retries=MAX_RETRIES, hedge_after_ms=HEDGE_AFTER_MS):
+        self.backend = backend
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.hedge_after_ms = hedge_after_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm-hedge")
+        self.usage = defaultdict(lambda: defaultdict(float))
+        self.usage_lock = threading.Lock()
+
+    # Users
+    @contextmanager
+    def user_context(self, user):
+        token = _current_user.set(user or "anonymous")
+        try:
+            yield
+        finally:
+            _current_user.reset(token)
+
+    def as_runnable(self):
+        """Drop-in for the old module-level `llm` in `prompt | llm | parser` chains."""
+        return RunnableLambda(self.invoke, name="LLMGateway")
+
+    # Calls
+    def _call_once(self, prompt, prompt_tokens, started=None, reserved=False):
+        """`started` is set once a slot is held; `reserved` means _try_reserve already took slot and quota."""
+        if not reserved:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(prompt_tokens)
+            self.slots.acquire()
+        try:
+            if started is not None:
+                started.set()
+            message = self.backend.invoke(prompt)
+        finally:
+            self.slots.release()
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.token_bucket.debit(usage.get("output_tokens", 0))
+        return message
+
+    def _try_reserve(self, prompt_tokens):
+        """Slot and quota for a backup request, only if all are free right now."""
+        if not self.slots.acquire(blocking=False):
+            return False
+        if not self.request_bucket.try_acquire(1):
+            self.slots.release()
+            return False
+        if not self.token_bucket.try_acquire(prompt_tokens):
+            self.request_bucket.debit(-1)
+            self.slots.release()
+            return False
+        return True
+
+    def _call_hedged(self, prompt, prompt_tokens, user):
+        started = threading.Event()
+        primary = self.executor.submit(self._call_once, prompt, prompt_tokens, started)
+        primary.add_done_callback(lambda future: started.set())
+        # Time queued for quota or a slot is our own backlog, not provider latency
+        started.wait()
+        done, _ = wait([primary], timeout=self.hedge_after_ms / 1000)
+        # A saturated process gains nothing from doubling its load, so hedge only into spare capacity
+        if done or not self._try_reserve(prompt_tokens):
+            return primary.result(), False
+        backup = self.executor.submit(self._call_once, prompt, prompt_tokens, reserved=True)
+        done, _ = wait([primary, backup], return_when=FIRST_COMPLETED)
+        winner = next(iter(done))
+        if winner.exception() is not None:
+            winner = backup if winner is primary else primary
+        # The losing request still runs to completion and burns quota; bill it to the same user
+        loser = backup if winner is primary else primary
+        loser.add_done_callback(lambda future: self._account_hedge_loser(user, future))
+        return winner.result(), True
+
+    def invoke(self, prompt):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        prompt_tokens = estimate_tokens(text)
+        user = _current_user.get()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                if self.hedge_after_ms:
+                    message, hedged = self._call_hedged(prompt, prompt_tokens, user)
+                else:
+                    message, hedged = self._call_once(prompt, prompt_tokens), False
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._account(user, None, time.perf_counter() - start, attempt, failed=True)
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+                attempt += 1
+
+        latency = time.perf_counter() - start
+        self._account(user, message, latency, attempt)
+        message.response_metadata["gateway"] = {"user": user, "retries": attempt, "hedged": hedged, "latency_ms": round(latency * 1000, 1)}
+        return message
+
+    # Accounting
+    def _account(self, user, message, latency, retries, failed=False):
+        usage = (getattr(message, "usage_metadata", None) or {}) if message is not None else {}
+        with self.usage_lock:
+            stats = self.usage[user]
+            stats["calls"] += 1
+            stats["errors"] += failed
+            stats["retries"] += retries
+            stats["input_tokens"] += usage.get("input_tokens", 0)
+            stats["output_tokens"] += usage.get("output_tokens", 0)
+            stats["latency_ms"] += latency * 1000
+
+    def _account_hedge_loser(self, user, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        usage = getattr(future.result(), "usage_metadata", None) or {}
+        with self.usage_lock:
+            stats = self.usage[user]
+            stats["input_tokens"] += usage.get("input_tokens", 0)
+            stats["output_tokens"] += usage.get("output_tokens", 0)
+            stats["hedge_tokens"] += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+    def usage_report(self):
+        """Per-user totals since process start."""
+        with self.usage_lock:
+            rows = []
+            for user, stats in self.usage.items():
+                calls = stats["calls"] or 1
+                rows.append({
+                    "user": user,
+                    "calls": int(stats["calls"]),
+                    "errors": int(stats["errors"]),
+                    "retries": int(stats["retries"]),
+                    "input_tokens": int(stats["input_tokens"]),
+                    "output_tokens": int(stats["output_tokens"]),
+                    "hedge_tokens": int(stats["hedge_tokens"]),
+                    "avg_latency_ms": round(stats["latency_ms"] / calls, 1),
+                })
+            return sorted(rows, key=lambda r: r["input_tokens"] + r["output_tokens"], reverse=True)
+
+def is_retryable(error):
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+def backoff_delay(attempt, error=None, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff, honouring a provider Retry-After header when present."""
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def create_gateway(backend_name=None, api_key=None):
+    """Build the process-wide gateway. LLM_BACKEND=fake swaps Groq for the offline backend."""
+    backend_name = backend_name or os.getenv("LLM_BACKEND", "groq")
+    if backend_name == "fake":
+        backend = FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("FAKE_LLM_JITTER_MS", "0")),
+        )
+        # The fake backend has no provider quota to respect
+        return LLMGateway(backend, requests_per_minute=10**6, tokens_per_minute=10**9)
+    if backend_name == "groq":
+        return LLMGateway(GroqBackend(api_key))
+    raise ValueError(f"Unknown LLM_BACKEND '{backend_name}' (expected 'groq' or 'fake')")
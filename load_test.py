@@ -0,0 +1,325 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+# --- CONFIGURATION ---
+REPORT_DIR = "capacity_reports"
+DEFAULT_MIX = "research=6,draft=3,convert=1"
+SAMPLE_INTERVAL_S = 10  # RSS / open-file sampling period
+SOURCE_IMAGES_PER_ANSWER = 2  # Verification Deck renders one page per source tab the lawyer opens
+
+DRAFT_PROMPTS = [
+    "Draft a legal notice for cheque bounce of Rs 5 lakh under Section 138 NI Act. Client: Ramesh Kumar, drawer: Suresh Traders, cheque dated 12 March, dishonoured for insufficient funds.",
+    "Draft a bail application under Section 480 BNSS for my client Anil Sharma, arrested on 3 June for theft, FIR No. 221/2024, first offence, sole earning member.",
+    "Draft a rent agreement for an 11 month lease. Landlord: Meena Gupta, tenant: Rohit Verma, flat 4B Green Park Delhi, rent Rs 25,000, deposit Rs 50,000.",
+]
+CONVERT_QUERIES = ["302 IPC", "420 IPC", "498A IPC", "376 IPC", "304B IPC", "120B IPC", "506 IPC"]
+FALLBACK_RESEARCH = ["What is the punishment for murder under BNS?", "Explain anticipatory bail under BNSS."]
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 1),
+        "p50_ms": round(pick(50), 1),
+        "p95_ms": round(pick(95), 1),
+        "p99_ms": round(pick(99), 1),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, weight = part.split("=")
+        mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"research", "draft", "convert"}
+    if unknown:
+        raise ValueError(f"❌ Unknown turn types in mix: {sorted(unknown)}")
+    return mix
+
+# --- PROCESS SAMPLING ---
+# /proc on Linux; psutil (if installed) on Windows/macOS; None when neither can tell us
+def _psutil_process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        pass
+    process = _psutil_process()
+    if process is not None:
+        return process.memory_info().rss / 1e6
+    try:
+        import resource  # Peak rather than current RSS, but still shows a leak; kB on Linux, bytes on macOS
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def _open_files():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        pass
+    process = _psutil_process()
+    if process is None:
+        return None
+    return process.num_handles() if os.name == "nt" else process.num_fds()
+
+class Sampler(threading.Thread):
+    """Samples RSS and open file descriptors until stopped (fd growth flags unclosed PDFs)."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_S):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.start_time = time.perf_counter()
+
+    def sample(self):
+        rss_mb = _rss_mb()
+        self.samples.append({"t_s": round(time.perf_counter() - self.start_time, 1),
+                             "rss_mb": None if rss_mb is None else round(rss_mb, 1), "open_files": _open_files()})
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def summary(self):
+        if len(self.samples) < 2 or self.samples[0]["rss_mb"] is None:
+            return {"samples": self.samples}
+        # Ignore the first fifth (model/index warm-up) when estimating the leak rate
+        steady = self.samples[len(self.samples) // 5:]
+        hours = (steady[-1]["t_s"] - steady[0]["t_s"]) / 3600 or 1e-9
+        return {
+            "start_mb": self.samples[0]["rss_mb"],
+            "end_mb": self.samples[-1]["rss_mb"],
+            "peak_mb": max(s["rss_mb"] for s in self.samples),
+            "growth_mb": round(self.samples[-1]["rss_mb"] - self.samples[0]["rss_mb"], 1),
+            "steady_growth_mb_per_hour": round((steady[-1]["rss_mb"] - steady[0]["rss_mb"]) / hours, 1),
+            "open_files_start": self.samples[0]["open_files"],
+            "open_files_end": self.samples[-1]["open_files"],
+            "samples": self.samples,
+        }
+
+# --- STORE CONTENTION ---
+class StoreProbe:
+    """
+    Replays what app_ui.py does to its stores on every turn, against scratch copies:
+    a full read-modify-write of the JSON chat file and an FTS insert into the search index.
+    Torn JSON reads are counted because load_db() silently turns them into an empty DB.
+    """
+
+    def __init__(self, work_dir):
+        from case_search import index_message
+        self.index_message = index_message
+        self.json_path = os.path.join(work_dir, "jurisone_data.json")
+        self.search_path = os.path.join(work_dir, "case_search.sqlite3")
+        with open(self.json_path, "w") as f:
+            json.dump({}, f)
+        self.json_ms, self.sqlite_ms = [], []
+        self.json_read_errors = self.sqlite_lock_errors = 0
+        self.lock = threading.Lock()
+
+    def append(self, user, case_id, message):
+        start = time.perf_counter()
+        try:
+            with open(self.json_path, "r") as f:
+                db = json.load(f)
+        except json.JSONDecodeError:
+            db = {}
+            with self.lock:
+                self.json_read_errors += 1
+        history = db.setdefault(user, {"chats": {}})["chats"].setdefault(case_id, [])
+        history.append(message)
+        with open(self.json_path, "w") as f:
+            json.dump(db, f, indent=4)
+        json_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        try:
+            self.index_message(user, case_id, len(history) - 1, message, path=self.search_path)
+        except sqlite3.OperationalError:
+            with self.lock:
+                self.sqlite_lock_errors += 1
+        sqlite_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.json_ms.append(json_ms)
+            self.sqlite_ms.append(sqlite_ms)
+
+    def summary(self):
+        return {
+            "json": {**_percentiles(self.json_ms), "torn_reads": self.json_read_errors, "file_mb": round(os.path.getsize(self.json_path) / 1e6, 2)},
+            "sqlite": {**_percentiles(self.sqlite_ms), "lock_errors": self.sqlite_lock_errors},
+        }
+
+# --- SIMULATED USERS ---
+class LoadRun:
+    def __init__(self, app, users, mix, duration_s, think_ms, store):
+        self.app = app
+        self.users = users
+        self.mix = mix
+        self.deadline = time.perf_counter() + duration_s
+        self.think_ms = think_ms
+        self.store = store
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        self.research_queries = self._research_queries()
+
+    def _research_queries(self):
+        from embedding_backends import load_benchmark_queries
+        try:
+            return load_benchmark_queries() or FALLBACK_RESEARCH
+        except OSError:
+            return FALLBACK_RESEARCH
+
+    def _timed(self, kind, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self.lock:
+                self.errors[kind] += 1
+            return None
+        finally:
+            with self.lock:
+                self.latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    def _turn(self, user, case_id, history, rng):
+        kind = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if kind == "convert":
+            self._timed("convert", self.app.convert_law_code, rng.choice(CONVERT_QUERIES), user=user)
+            return
+
+        prompt = rng.choice(DRAFT_PROMPTS if kind == "draft" else self.research_queries)
+        message = {"role": "user", "content": prompt}
+        history.append(message)
+        self.store.append(user, case_id, message)
+
+        response = self._timed(kind, self.app.ask_legal_ai, prompt, history, user=user)
+        if response is None:
+            return
+        answer = {"role": "assistant", "content": response["answer"]}
+        history.append(answer)
+        self.store.append(user, case_id, answer)
+        for doc in (response.get("context") or [])[:SOURCE_IMAGES_PER_ANSWER]:
+            self._timed("source_image", self.app.get_source_image, doc.metadata.get("source", ""), doc.metadata.get("page", 0), excerpt=doc.page_content)
+
+    def user_loop(self, n):
+        rng = random.Random(n)
+        user = f"load_user_{n}"
+        history = []
+        case = 1
+        while time.perf_counter() < self.deadline:
+            if len(history) >= 40:  # Lawyers open a new case file long before histories get this big
+                history, case = [], case + 1
+            self._turn(user, f"Case File #{case}", history, rng)
+            time.sleep(rng.expovariate(1000 / self.think_ms) if self.think_ms else 0)
+
+    def run(self):
+        threads = [threading.Thread(target=self.user_loop, args=(n,), daemon=True) for n in range(self.users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+# --- REPORT ---
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_load_test(users=8, duration_s=300, mix=DEFAULT_MIX, think_ms=2000, fake_latency_ms=800, sample_s=SAMPLE_INTERVAL_S, report_dir=REPORT_DIR):
+    # The fake backend must be chosen before app_logic builds its gateway
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    os.environ.setdefault("FAKE_LLM_LATENCY_MS", str(fake_latency_ms))
+    # Keep synthetic spans out of the production trace file the admin panel reads
+    os.makedirs(report_dir, exist_ok=True)
+    os.environ["TRACE_FILE"] = os.path.join(report_dir, "load_traces.jsonl")
+    import telemetry
+    telemetry.TRACE_FILE = os.environ["TRACE_FILE"]  # In case telemetry was imported earlier
+    import app_logic
+    from telemetry import recent_spans, stage_summary
+
+    sampler = Sampler(sample_s)
+    sampler.sample()
+    with tempfile.TemporaryDirectory() as work:
+        store = StoreProbe(work)
+        load = LoadRun(app_logic, users, parse_mix(mix), duration_s, think_ms, store)
+        print(f"🏋️ {users} users for {duration_s}s, mix {mix}, fake LLM {os.environ['FAKE_LLM_LATENCY_MS']} ms ({os.environ['LLM_BACKEND']})...")
+        sampler.start()
+        start = time.perf_counter()
+        load.run()
+        elapsed = time.perf_counter() - start
+        sampler.stopped.set()
+        gc.collect()
+        sampler.sample()
+        store_summary = store.summary()
+
+    turns = sum(len(v) for k, v in load.latencies.items() if k != "source_image")
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "config": {
+            "users": users, "duration_s": duration_s, "mix": mix, "think_ms": think_ms,
+            "llm_backend": os.environ["LLM_BACKEND"], "fake_llm_latency_ms": int(os.environ["FAKE_LLM_LATENCY_MS"]),
+            "vector_backend": app_logic.VECTOR_BACKEND, "cpu_count": os.cpu_count(),
+        },
+        "elapsed_s": round(elapsed, 1),
+        "turns": turns,
+        "throughput_turns_per_s": round(turns / elapsed, 2),
+        "errors": dict(load.errors),
+        "latency": {kind: _percentiles(values) for kind, values in sorted(load.latencies.items())},
+        "stages": stage_summary(recent_spans()),
+        "memory": sampler.summary(),
+        "stores": store_summary,
+    }
+
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"capacity-{datetime.datetime.now():%Y%m%d-%H%M%S}-{users}u.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"✅ {turns} turns in {elapsed:.0f}s ({report['throughput_turns_per_s']} turns/s), errors: {report['errors'] or 'none'}")
+    for kind, stats in report["latency"].items():
+        print(f"   {kind:<13} p50 {stats['p50_ms']:>8} ms   p95 {stats['p95_ms']:>8} ms   p99 {stats['p99_ms']:>8} ms")
+    memory = report["memory"]
+    if "growth_mb" in memory:
+        print(f"   RSS {memory['start_mb']} -> {memory['end_mb']} MB ({memory['steady_growth_mb_per_hour']} MB/h steady), "
+              f"open files {memory['open_files_start']} -> {memory['open_files_end']}")
+    print(f"   JSON store p95 {store_summary['json'].get('p95_ms')} ms ({store_summary['json']['torn_reads']} torn reads), "
+          f"search index p95 {store_summary['sqlite'].get('p95_ms')} ms ({store_summary['sqlite']['lock_errors']} lock errors)")
+    print(f"📄 Capacity report -> {path}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent JurisOne users and write a capacity report.")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=int, default=300, help="Seconds to run (use hours for a soak, e.g. 10800)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative weights, e.g. research=6,draft=3,convert=1")
+    parser.add_argument("--think-ms", type=int, default=2000, help="Mean pause between a user's turns")
+    parser.add_argument("--fake-latency-ms", type=int, default=800, help="Fake LLM latency (ignored if FAKE_LLM_LATENCY_MS is set)")
+    parser.add_argument("--sample-s", type=int, default=SAMPLE_INTERVAL_S)
+    args = parser.parse_args()
+    run_load_test(args.users, args.duration, args.mix, args.think_ms, args.fake_latency_ms, args.sample_s)
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from page_store import get_pages, file_hash, has_ocr_text, write_ocr_text
+
+# --- CONFIGURATION ---
+DATA_FOLDER = "source_docs"
+MIN_TEXT_CHARS = 25          # Pages with less extracted text than this are treated as scans
+OCR_DPI = 300
+OCR_LANG = os.getenv("OCR_LANG", "eng+hin")
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "60"))  # Seconds per page before tesseract is killed
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+def find_text_less_pages(pdf_paths, lang=OCR_LANG):
+    """(pdf_path, digest, page) for pages with no usable text layer and no cached OCR in `lang` yet."""
+    todo = []
+    checked = 0
+    for pdf_path in pdf_paths:
+        digest = file_hash(pdf_path)
+        for page, text in enumerate(get_pages(pdf_path)):
+            checked += 1
+            if len(text.strip()) < MIN_TEXT_CHARS and not has_ocr_text(digest, page, lang):
+                todo.append((pdf_path, digest, page))
+    return todo, checked
+
+def _ocr_page(pdf_path, page, dpi=OCR_DPI, lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT):
+    """Runs in a worker process. Returns (text, seconds, status)."""
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+
+    start = time.perf_counter()
+    with fitz.open(pdf_path) as doc:
+        pdf_page = doc.load_page(page)
+        if not pdf_page.get_images():
+            return "", time.perf_counter() - start, "blank"  # Genuinely empty page, nothing to read
+        pix = pdf_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    try:
+        text = pytesseract.image_to_string(image, lang=lang, timeout=timeout)
+    except pytesseract.TesseractError:  # Subclasses RuntimeError, so it must be caught first
+        return "", time.perf_counter() - start, "failed"
+    except RuntimeError as e:
+        if "timeout" not in str(e).lower():
+            raise
+        return "", time.perf_counter() - start, "timeout"
+    return text, time.perf_counter() - start, "ok"
+
+def _installed_languages(lang=OCR_LANG):
+    """The requested `a+b` languages that have traineddata installed, as a tesseract lang string."""
+    import pytesseract
+    available = set(pytesseract.get_languages(config=""))
+    wanted = lang.split("+")
+    missing = [l for l in wanted if l not in available]
+    if missing:
+        print(f"⚠️ OCR languages not installed: {', '.join(missing)} (have: {', '.join(sorted(available))})")
+    return "+".join(l for l in wanted if l in available)
+
+def run_ocr_stage(pdf_paths, workers=OCR_WORKERS):
+    """OCR every text-less page once per language set, in parallel, caching results by (file hash, page)."""
+    if not shutil.which("tesseract"):
+        print("⚠️ tesseract not installed: skipping OCR of scanned pages.")
+        return None
+
+    lang = _installed_languages()
+    if not lang:
+        print("⚠️ None of the OCR languages are installed: skipping OCR of scanned pages.")
+        return None
+
+    todo, checked = find_text_less_pages(pdf_paths, lang)
+    report = {"pages_checked": checked, "pages_to_ocr": len(todo), "ok": 0, "blank": 0, "timeout": 0, "failed": 0, "cpu_seconds": 0.0}
+    if not todo:
+        print(f"🔎 OCR: {checked} pages checked, none need OCR.")
+        return report
+
+    print(f"🔎 OCR: {len(todo)} of {checked} pages have no text layer. Using {workers} workers...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_ocr_page, pdf_path, page, lang=lang): (digest, page) for pdf_path, digest, page in todo}
+        for future in as_completed(futures):
+            digest, page = futures[future]
+            try:
+                text, seconds, status = future.result()
+            except Exception as e:
+                print(f"   ⚠️ OCR failed on {digest[:8]} page {page}: {e}")
+                report["failed"] += 1
+                continue
+            report[status] += 1
+            report["cpu_seconds"] += seconds
+            if status in ("ok", "blank"):  # Timeouts and tesseract errors are retried on the next run
+                write_ocr_text(digest, page, text, lang)
+
+    elapsed = time.perf_counter() - start
+    report["wall_seconds"] = round(elapsed, 1)
+    report["pages_per_second"] = round(len(todo) / elapsed, 2)
+    print(f"✅ OCR: {report['ok']} pages read, {report['blank']} blank, {report['timeout']} timed out, "
+          f"{report['failed']} failed in {elapsed:.1f}s ({report['pages_per_second']} pages/s).")
+    return report
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else DATA_FOLDER
+    run_ocr_stage([os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.pdf')])
@@ -0,0 +1,192 @@
+import os
+import mmap
+import zlib
+import struct
+import tempfile
+import hashlib
+import threading
+import fitz  # PyMuPDF
+from langchain_core.documents import Document
+
+# --- CONFIGURATION ---
+PAGE_CACHE_DIR = "page_cache"
+OCR_CACHE_DIR = os.path.join(PAGE_CACHE_DIR, "ocr")
+MAGIC = b"JPS1"
+HEADER = struct.Struct("<4sI")  # magic, page count
+OFFSET = struct.Struct("<Q")
+
+_hash_memo = {}
+_open_stores = {}
+_lock = threading.Lock()
+
+# --- HASHING ---
+def file_hash(path):
+    """sha256 of the file contents, memoized on (path, size, mtime) for this process."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_memo:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _hash_memo[key] = digest.hexdigest()
+    return _hash_memo[key]
+
+def _store_path(digest):
+    return os.path.join(PAGE_CACHE_DIR, f"{digest}.pages")
+
+def _atomic_write(path, chunks):
+    """Write to a unique temp file beside `path`, then rename: app workers and ingest may race on one digest."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# --- STORE FORMAT ---
+# [magic][page count][count + 1 offsets][zlib page 0][zlib page 1]...
+# Offsets are relative to the end of the offset table, so a page is one slice of the mmap.
+def write_pages(digest, pages):
+    blobs = [zlib.compress(text.encode("utf-8"), 6) for text in pages]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+    path = _store_path(digest)
+    _atomic_write(path, [HEADER.pack(MAGIC, len(pages))] + [OFFSET.pack(o) for o in offsets] + blobs)
+    return path
+
+class PageTexts:
+    """Read-only, memory-mapped view of one PDF's extracted pages. Pages decompress on access."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"❌ {path} is not a page store file")
+        self._table = HEADER.size
+        self._data = self._table + (self.count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, page):
+        if not 0 <= page < self.count:
+            raise IndexError(page)
+        start, = OFFSET.unpack_from(self._map, self._table + page * OFFSET.size)
+        end, = OFFSET.unpack_from(self._map, self._table + (page + 1) * OFFSET.size)
+        return zlib.decompress(self._map[self._data + start:self._data + end]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(self.count))
+
+# --- EXTRACTION ---
+def extract_pages(pdf_path):
+    """PyMuPDF text extraction, one string per page."""
+    with fitz.open(pdf_path) as doc:
+        return [page.get_text("text") for page in doc]
+
+def get_pages(pdf_path):
+    """Extracted text for every page, parsing the PDF only the first time its contents are seen."""
+    digest = file_hash(pdf_path)
+    with _lock:
+        if digest in _open_stores:
+            return _open_stores[digest]
+        path = _store_path(digest)
+        if not os.path.exists(path):
+            write_pages(digest, extract_pages(pdf_path))
+        store = _open_stores[digest] = PageTexts(path)
+        return store
+
+# --- OCR OVERLAY ---
+# Scanned pages have no text layer; ocr_stage.py fills these, one small file per page.
+# Each file starts with a "lang=<tesseract langs>" line, so installing more traineddata
+# makes ocr_stage.py redo pages that were read without it. Older files have no header.
+LANG_HEADER = "lang="
+
+def _ocr_path(digest, page):
+    return os.path.join(OCR_CACHE_DIR, digest, f"{page}.zz")
+
+def _read_ocr(digest, page):
+    """(lang or None, text), or None when the page was never OCR'd."""
+    path = _ocr_path(digest, page)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        payload = zlib.decompress(f.read()).decode("utf-8")
+    if payload.startswith(LANG_HEADER):
+        header, _, text = payload.partition("\n")
+        return header[len(LANG_HEADER):], text
+    return None, payload
+
+def has_ocr_text(digest, page, lang=None):
+    """With `lang`, only OCR done with exactly those languages counts."""
+    if not lang:
+        return os.path.exists(_ocr_path(digest, page))
+    cached = _read_ocr(digest, page)
+    return cached is not None and cached[0] == lang
+
+def read_ocr_text(digest, page):
+    cached = _read_ocr(digest, page)
+    return cached[1] if cached else None
+
+def write_ocr_text(digest, page, text, lang):
+    path = _ocr_path(digest, page)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _atomic_write(path, [zlib.compress(f"{LANG_HEADER}{lang}\n{text}".encode("utf-8"), 6)])
+
+def _with_ocr(digest, page, text):
+    """(text, from_ocr): the OCR text wins only where it recovered more than the text layer had."""
+    ocr_text = read_ocr_text(digest, page)
+    if ocr_text is not None and len(ocr_text.strip()) > len(text.strip()):
+        return ocr_text, True
+    return text, False
+
+def get_page_text(pdf_path, page):
+    pages = get_pages(pdf_path)
+    if not 0 <= page < len(pages):
+        return ""
+    return _with_ocr(file_hash(pdf_path), page, pages[page])[0]
+
+def load_documents(pdf_path):
+    """Page-level Documents with the same `source`/`page` metadata PyPDFLoader produced."""
+    digest = file_hash(pdf_path)
+    documents = []
+    for i, text in enumerate(get_pages(pdf_path)):
+        metadata = {"source": pdf_path, "page": i, "file_hash": digest}
+        text, from_ocr = _with_ocr(digest, i, text)
+        if from_ocr:
+            metadata["ocr"] = True
+        if text.strip():
+            documents.append(Document(page_content=text, metadata=metadata))
+    return documents
+
+def iter_pages(pdf_paths):
+    """(pdf_path, page, text) for every page of every PDF. For dedupe and lexical indexes."""
+    for pdf_path in pdf_paths:
+        digest = file_hash(pdf_path)
+        for i, text in enumerate(get_pages(pdf_path)):
+            yield pdf_path, i, _with_ocr(digest, i, text)[0]
+
+def _normalize(text):
+    return " ".join(text.split()).lower()
+
+def locate_excerpt(pdf_path, page, excerpt, window=1):
+    """The page within +/- `window` whose text contains the excerpt's opening, else `page`."""
+    needle = _normalize(excerpt)[:80]
+    if not needle:
+        return page
+    pages = get_pages(pdf_path)
+    digest = file_hash(pdf_path)
+    for candidate in [page] + [p for d in range(1, window + 1) for p in (page - d, page + d)]:
+        # OCR'd pages have no text layer; match against what retrieval actually indexed
+        if 0 <= candidate < len(pages) and needle in _normalize(_with_ocr(digest, candidate, pages[candidate])[0]):
+            return candidate
+    return page
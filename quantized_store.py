@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import shutil
+import numpy as np
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# --- CONFIGURATION ---
+STORE_PATH = os.getenv("QUANTIZED_STORE_PATH", "vector_store_q8")
+CHROMA_PATH = "vector_db"
+CHROMA_COLLECTION = "langchain"  # langchain_chroma's default collection name
+NPROBE = int(os.getenv("QUANTIZED_NPROBE", "8"))   # IVF lists scanned per query
+RERANK = int(os.getenv("QUANTIZED_RERANK", "50"))  # Candidates re-scored in float32
+KMEANS_ITERATIONS = 12
+KMEANS_SAMPLE = 20000
+MIGRATE_BATCH = 5000
+INDEX_META_NAME = "index_meta.json"  # Written by ingest_data.py; its build_id identifies one ingest
+
+# Files in a store directory. Everything except the manifest is memory-mapped on open.
+#   manifest.json     dim, count, lists, source model, source_build (the Chroma ingest it came from)
+#   centroids.npy     [lists, dim] float32  IVF coarse quantizer
+#   list_offsets.npy  [lists + 1] int64     rows of list i are list_offsets[i]:list_offsets[i+1]
+#   scale.npy         [dim] float32         per-dimension int8 scale
+#   codes.npy         [count, dim] int8     what the scan reads
+#   vectors.npy       [count, dim] float32  full precision, only touched for re-scoring
+#   records.bin       JSON {"text", "metadata"} per row, back to back
+#   record_offsets.npy [count + 1] int64
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+# --- BUILD ---
+def _kmeans(vectors, lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on a sample. Good enough for an IVF coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(lists):
+            members = sample[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+def _assign(vectors, centroids, batch=20000):
+    return np.concatenate([np.argmax(vectors[i:i + batch] @ centroids.T, axis=1) for i in range(0, len(vectors), batch)])
+
+def source_build(db_path=CHROMA_PATH):
+    """build_id of the Chroma index in `db_path`, or None if it predates build ids or is missing."""
+    path = os.path.join(db_path, INDEX_META_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("build_id")
+
+def stale_reason(store_dir=STORE_PATH, db_path=CHROMA_PATH):
+    """Why the store at `store_dir` doesn't match the Chroma index it mirrors, or None if it does."""
+    with open(os.path.join(store_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        built_from = json.load(f).get("source_build")
+    expected = source_build(db_path)
+    if expected is not None and built_from != expected:
+        return f"'{store_dir}' was built from index {built_from}, '{db_path}' is {expected}"
+    return None
+
+def build_store(vectors, texts, metadatas, out_dir=STORE_PATH, model_name=None, lists=None, built_from=None):
+    """Write a store from float vectors plus their chunk text and metadata."""
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    if vectors.ndim != 2 or len(vectors) == 0:
+        raise ValueError("❌ No vectors to store")
+    count, dim = vectors.shape
+    # k-means needs at least one sample point per list
+    lists = min(lists or max(1, min(4096, int(4 * np.sqrt(count)))), count, KMEANS_SAMPLE)
+
+    centroids = _kmeans(vectors, lists)
+    assignment = _assign(vectors, centroids)
+    order = np.argsort(assignment, kind="stable")
+    list_offsets = np.searchsorted(assignment[order], np.arange(lists + 1)).astype(np.int64)
+    scale = (np.abs(vectors).max(axis=0) / 127.0).astype(np.float32)
+    scale[scale == 0] = 1.0
+
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp_dir, "list_offsets.npy"), list_offsets)
+    np.save(os.path.join(tmp_dir, "scale.npy"), scale)
+
+    codes = np.lib.format.open_memmap(os.path.join(tmp_dir, "codes.npy"), mode="w+", dtype=np.int8, shape=(count, dim))
+    full = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim))
+    record_offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(os.path.join(tmp_dir, "records.bin"), "wb") as records:
+        for row, source in enumerate(order):
+            full[row] = vectors[source]
+            codes[row] = np.clip(np.round(vectors[source] / scale), -127, 127)
+            blob = json.dumps({"text": texts[source], "metadata": metadatas[source] or {}}).encode("utf-8")
+            records.write(blob)
+            record_offsets[row + 1] = record_offsets[row] + len(blob)
+    codes.flush()
+    full.flush()
+    del codes, full
+    np.save(os.path.join(tmp_dir, "record_offsets.npy"), record_offsets)
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"format": "ivf-int8-v1", "dim": dim, "count": count, "lists": lists, "model": model_name,
+                   "source_build": built_from}, f, indent=4)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+# --- SEARCH ---
+class QuantizedStore:
+    """Memory-mapped IVF index over int8 codes with float32 re-scoring of the best candidates."""
+
+    def __init__(self, path=STORE_PATH, db_path=CHROMA_PATH):
+        self.path = path
+        stale = stale_reason(path, db_path)
+        if stale:
+            # Serving it would silently answer from the previous corpus
+            raise ValueError(f"❌ Quantized store is stale: {stale}. Run: python quantized_store.py migrate")
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.scale = np.load(os.path.join(path, "scale.npy"))
+        self.codes = load("codes.npy")
+        self.vectors = load("vectors.npy")
+        self.record_offsets = load("record_offsets.npy")
+        self.records = np.memmap(os.path.join(path, "records.bin"), dtype=np.uint8, mode="r") if self.manifest["count"] else None
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def record(self, row):
+        start, end = int(self.record_offsets[row]), int(self.record_offsets[row + 1])
+        return json.loads(self.records[start:end].tobytes().decode("utf-8"))
+
+    def search_rows(self, query_vector, k=5, nprobe=NPROBE, rerank=RERANK):
+        """Row ids and float32 cosine scores of the approximate top-k."""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        scaled_query = query * self.scale
+
+        candidates, approx = [], []
+        for i in probes:
+            start, end = self.list_offsets[i], self.list_offsets[i + 1]
+            if start == end:
+                continue
+            candidates.append(np.arange(start, end))
+            approx.append(self.codes[start:end].astype(np.float32) @ scaled_query)
+        if not candidates:
+            return [], []
+
+        candidates = np.concatenate(candidates)
+        approx = np.concatenate(approx)
+        keep = min(len(candidates), max(rerank, k))
+        shortlist = np.sort(candidates[np.argpartition(-approx, keep - 1)[:keep]])  # Sorted rows read the memmap sequentially
+        exact = self.vectors[shortlist] @ query
+        best = np.argsort(-exact)[:k]
+        return shortlist[best].tolist(), exact[best].tolist()
+
+    def search(self, query_vector, k=5, **kwargs):
+        rows, scores = self.search_rows(query_vector, k, **kwargs)
+        documents = []
+        for row, score in zip(rows, scores):
+            record = self.record(row)
+            documents.append(Document(page_content=record["text"], metadata={**record["metadata"], "score": round(score, 4)}))
+        return documents
+
+    def exact_rows(self, query_vector, k=5, batch=50000):
+        """Brute-force float32 top-k, the ground truth for recall measurements."""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = np.concatenate([self.vectors[i:i + batch] @ query for i in range(0, len(self), batch)])
+        return np.argsort(-scores)[:k].tolist()
+
+class QuantizedRetriever(BaseRetriever):
+    """Drop-in for `vector_db.as_retriever(...)` backed by a QuantizedStore."""
+
+    store: Any
+    embeddings: Any
+    k: int = 5
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.store.search(self.embeddings.embed_query(query), k=self.k)
+
+# --- MIGRATION & REPORT ---
+def migrate_from_chroma(db_path=CHROMA_PATH, out_dir=STORE_PATH, collection_name=CHROMA_COLLECTION):
+    import chromadb
+    from embedding_backends import EMBEDDING_MODEL
+
+    collection = chromadb.PersistentClient(path=db_path).get_collection(collection_name)
+    total = collection.count()
+    if total == 0:
+        print(f"⚠️ '{db_path}' has no chunks: nothing to migrate.")
+        return
+    print(f"📦 Migrating {total} chunks from '{db_path}'...")
+
+    vectors, texts, metadatas = [], [], []
+    for offset in range(0, total, MIGRATE_BATCH):
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=MIGRATE_BATCH, offset=offset)
+        vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+        texts.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        print(f"   -> Read {min(offset + MIGRATE_BATCH, total)}/{total}")
+
+    build_store(np.concatenate(vectors), texts, metadatas, out_dir, model_name=EMBEDDING_MODEL, built_from=source_build(db_path))
+    print(f"✅ Store written to '{out_dir}'.")
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def report(store_dir=STORE_PATH, db_path=CHROMA_PATH, k=5):
+    """Memory footprint and recall@k/latency against exact float32 search for a sweep of nprobe."""
+    from embedding_backends import get_embeddings, load_benchmark_queries
+
+    store = QuantizedStore(store_dir)
+    embeddings = get_embeddings()
+    query_vectors = embeddings.embed_documents(load_benchmark_queries())
+    truth = [set(store.exact_rows(v, k)) for v in query_vectors]
+
+    count, dim = store.manifest["count"], store.manifest["dim"]
+    print(f"📊 {count} chunks, {dim}-d, {store.manifest['lists']} lists")
+    print(f"   -> int8 codes (scanned):       {store.codes.nbytes / 1e6:9.1f} MB")
+    print(f"   -> float32 vectors (re-score): {store.vectors.nbytes / 1e6:9.1f} MB on disk, paged in per candidate")
+    print(f"   -> chunk records:              {os.path.getsize(os.path.join(store_dir, 'records.bin')) / 1e6:9.1f} MB on disk")
+    if os.path.exists(db_path):
+        print(f"   -> Chroma directory:           {_dir_size(db_path) / 1e6:9.1f} MB")
+
+    for nprobe in (1, 4, 8, 16, 32):
+        start = time.perf_counter()
+        found = [set(store.search_rows(v, k, nprobe=nprobe)[0]) for v in query_vectors]
+        latency = (time.perf_counter() - start) / len(query_vectors) * 1000
+        recall = sum(len(f & t) for f, t in zip(found, truth)) / (k * len(truth))
+        print(f"   nprobe={nprobe:<3d} recall@{k} {recall:6.1%}   {latency:6.2f} ms/query")
+
+if __name__ == "__main__":
+    # Usage: python quantized_store.py migrate | report
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "migrate":
+        migrate_from_chroma()
+    elif command == "report":
+        report()
+    else:
+        print("Usage: python quantized_store.py migrate | report")
@@ -0,0 +1,39 @@
+import requests
+from typing import List
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+# Shared keep-alive connection pool for every call from this worker
+_session = requests.Session()
+
+def _post(url, path, payload, timeout):
+    response = _session.post(f"{url.rstrip('/')}{path}", json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+class RemoteRetriever(BaseRetriever):
+    """Drop-in for `vector_db.as_retriever(...)` backed by retrieval_service.py."""
+
+    url: str
+    k: int = 5
+    timeout: float = 30.0
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        result = _post(self.url, "/search", {"query": query, "k": self.k}, self.timeout)
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in result["documents"]]
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings computed by the shared service, so the worker never loads MiniLM."""
+
+    def __init__(self, url, timeout=30.0):
+        self.url = url
+        self.timeout = timeout
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return _post(self.url, "/embed", {"texts": list(texts)}, self.timeout)["vectors"]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_chroma import Chroma
+from embedding_backends import get_embeddings
+from telemetry import trace_span
+from index_artifacts import ensure_index
+from index_maintenance import collection_metadata
+
+# --- CONFIGURATION ---
+DB_PATH = "vector_db"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+SERVICE_HOST = os.getenv("RETRIEVAL_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("RETRIEVAL_SERVICE_PORT", "8765"))
+MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "32"))
+MAX_WAIT_MS = float(os.getenv("RETRIEVAL_MAX_WAIT_MS", "5"))  # How long the first query waits for company
+INDEX_ARTIFACT_URL = os.getenv("INDEX_ARTIFACT_URL")
+DEFAULT_K = 5
+
+# --- MICRO-BATCHING ---
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests and embeds them in one forward pass.
+    The first text in a batch waits at most MAX_WAIT_MS for others to arrive.
+    """
+
+    def __init__(self, embed_documents, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.embed_documents = embed_documents
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.pending = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name="embed-batcher").start()
+
+    def submit(self, text):
+        future = Future()
+        self.pending.put((text, future))
+        return future
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                with trace_span("service_embed_batch", batch_size=len(texts)):
+                    vectors = self.embed_documents(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+# --- SERVICE ---
+class RetrievalService:
+    """Owns the only copy of the embedder and the Chroma client for every app worker on the box."""
+
+    def __init__(self, db_path=DB_PATH):
+        ensure_index(INDEX_ARTIFACT_URL)
+        self.embeddings = get_embeddings()
+        if VECTOR_BACKEND == "quantized":
+            from quantized_store import QuantizedStore
+            self.vector_db = QuantizedStore()
+        else:
+            self.vector_db = Chroma(persist_directory=db_path, embedding_function=self.embeddings, collection_metadata=collection_metadata(db_path))
+        self.batcher = MicroBatcher(self.embeddings.embed_documents)
+
+    def embed(self, texts):
+        futures = [self.batcher.submit(text) for text in texts]  # Queue all first so they share batches
+        return [future.result() for future in futures]
+
+    def search(self, query, k=DEFAULT_K):
+        with trace_span("service_search", k=k) as span:
+            vector = self.batcher.embed(query)
+            if VECTOR_BACKEND == "quantized":
+                docs = self.vector_db.search(vector, k=k)
+            else:
+                docs = self.vector_db.similarity_search_by_vector(vector, k=k)
+            span.set(chunks=len(docs))
+        return [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so workers reuse one connection
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/search":
+                    self._reply(200, {"documents": service.search(request["query"], int(request.get("k", DEFAULT_K)))})
+                elif self.path == "/embed":
+                    self._reply(200, {"vectors": service.embed(request["texts"])})
+                else:
+                    self._reply(404, {"error": "not found"})
+            except (KeyError, ValueError) as e:
+                self._reply(400, {"error": f"bad request: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT):
+    print("🧠 Loading embedder and index...")
+    service = RetrievalService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"✅ Retrieval service on http://{host}:{port} (batch ≤{MAX_BATCH}, wait ≤{MAX_WAIT_MS:g} ms)")
+    print(f"   -> Point app workers at it with RETRIEVAL_SERVICE_URL=http://{host}:{port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURATION ---
+TRACE_FILE = os.getenv("TRACE_FILE", "pipeline_traces.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))  # Rotated to TRACE_FILE.1 past this
+RECENT_LIMIT = 2000  # Spans kept in memory for the admin panel
+METRIC_PREFIX = "jurisone"
+
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_LIMIT)
+_totals = defaultdict(lambda: defaultdict(float))  # stage -> counter -> value
+_current = contextvars.ContextVar("jurisone_span", default=None)
+_server = None
+
+# --- SPANS ---
+class Span:
+    """One timed stage of the pipeline. Attributes are free-form numbers/strings."""
+
+    def __init__(self, stage, attrs):
+        parent = _current.get()
+        self.stage = stage
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent = parent.stage if parent else None
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "ts": self.started_at,
+            "trace_id": self.trace_id,
+            "stage": self.stage,
+            "parent": self.parent,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 2),
+            **self.attrs,
+        }
+
+@contextmanager
+def trace_span(stage, **attrs):
+    """Time a block and record it as a span, e.g. `with trace_span("retrieval") as span:`."""
+    span = Span(stage, attrs)
+    token = _current.set(span)
+    start = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span.status = "error"
+        span.set(error=type(e).__name__)
+        raise
+    finally:
+        span.duration_ms = (time.perf_counter() - start) * 1000
+        _current.reset(token)
+        _record(span)
+
+def record_llm_usage(span, message):
+    """Copy token counts from a LangChain AIMessage onto the span."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    span.set(
+        input_tokens=usage.get("input_tokens", 0),
+        output_tokens=usage.get("output_tokens", 0),
+        total_tokens=usage.get("total_tokens", 0),
+    )
+
+def _record(span):
+    row = span.to_dict()
+    with _lock:
+        _recent.append(row)
+        totals = _totals[span.stage]
+        totals["calls"] += 1
+        totals["errors"] += span.status == "error"
+        totals["duration_ms"] += span.duration_ms
+        totals["tokens"] += row.get("total_tokens", 0)
+        totals["chunks"] += row.get("chunks", 0)
+        totals["cache_hits"] += bool(row.get("cache_hit"))
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, default=str) + "\n")
+                size = f.tell()
+            if size > TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")  # Atomic; a worker racing us just starts a new file
+        except OSError:
+            pass  # Tracing must never break a chat turn
+
+# --- AGGREGATION ---
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _tail_lines(path, limit, block=64 * 1024):
+    """Last `limit` lines, reading backwards from the end so cost doesn't grow with the file."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0 and data.count(b"\n") <= limit:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.split(b"\n")
+    if pos > 0:
+        lines = lines[1:]  # Starts mid-line
+    return [line.decode("utf-8", errors="replace") for line in lines if line.strip()][-limit:]
+
+def read_trace_file(limit=RECENT_LIMIT):
+    """Last `limit` spans from the JSONL file (covers every worker writing to it)."""
+    lines = []
+    for path in (TRACE_FILE, f"{TRACE_FILE}.1"):  # Just after a rotation, top up from the previous file
+        if len(lines) < limit and os.path.exists(path):
+            lines = _tail_lines(path, limit - len(lines)) + lines
+    rows = []
+    for line in lines:
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return rows
+
+def recent_spans():
+    with _lock:
+        return list(_recent)
+
+def stage_summary(spans=None):
+    """p50/p95 latency and totals per stage, sorted by p95 (slowest first)."""
+    spans = recent_spans() if spans is None else spans
+    by_stage = defaultdict(list)
+    for row in spans:
+        by_stage[row["stage"]].append(row)
+
+    summary = []
+    for stage, rows in by_stage.items():
+        durations = [r["duration_ms"] for r in rows]
+        summary.append({
+            "stage": stage,
+            "calls": len(rows),
+            "p50_ms": round(_percentile(durations, 50), 1),
+            "p95_ms": round(_percentile(durations, 95), 1),
+            "errors": sum(r["status"] == "error" for r in rows),
+            "avg_tokens": round(sum(r.get("total_tokens", 0) for r in rows) / len(rows), 1),
+            "avg_chunks": round(sum(r.get("chunks", 0) for r in rows) / len(rows), 1),
+            "cache_hit_rate": round(sum(bool(r.get("cache_hit")) for r in rows) / len(rows), 2),
+        })
+    return sorted(summary, key=lambda s: s["p95_ms"], reverse=True)
+
+# --- PROMETHEUS EXPORT ---
+def prometheus_text():
+    """Render counters and recent quantiles in the Prometheus text exposition format."""
+    counters = {
+        "calls": ("stage_calls_total", "Spans recorded per stage"),
+        "errors": ("stage_errors_total", "Spans that raised per stage"),
+        "duration_ms": ("stage_duration_ms_sum", "Total time spent per stage"),
+        "tokens": ("stage_tokens_total", "LLM tokens used per stage"),
+        "chunks": ("stage_chunks_total", "Retrieved chunks per stage"),
+        "cache_hits": ("stage_cache_hits_total", "Cache hits per stage"),
+    }
+    with _lock:
+        totals = {stage: dict(values) for stage, values in _totals.items()}
+
+    lines = []
+    for key, (name, help_text) in counters.items():
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+        for stage, values in sorted(totals.items()):
+            lines.append(f'{METRIC_PREFIX}_{name}{{stage="{stage}"}} {values.get(key, 0):g}')
+
+    lines.append(f"# HELP {METRIC_PREFIX}_stage_latency_ms Recent latency quantiles per stage")
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_latency_ms gauge")
+    for row in stage_summary():
+        lines.append(f'{METRIC_PREFIX}_stage_latency_ms{{stage="{row["stage"]}",quantile="0.5"}} {row["p50_ms"]:g}')
+        lines.append(f'{METRIC_PREFIX}_stage_latency_ms{{stage="{row["stage"]}",quantile="0.95"}} {row["p95_ms"]:g}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrape requests out of the console
+
+def start_metrics_server(port):
+    """Serve /metrics on a daemon thread. Safe to call on every Streamlit rerun."""
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
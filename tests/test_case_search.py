@@ -0,0 +1,57 @@
+import time
+import random
+import sqlite3
+import statistics
+import pytest
+from case_search import search, sync_user, index_message
+
+WORDS = ("bail murder section cheque dishonour notice tenant rent landlord appeal writ petition "
+         "court evidence witness accused property divorce custody maintenance fir police").split()
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "case_search.sqlite3")
+
+def test_search_is_scoped_to_the_user(db):
+    sync_user("ram kumar", {"c1": [{"role": "user", "content": "cheque bounce notice"}]}, path=db)
+    sync_user("ram", {"c2": [{"role": "user", "content": "cheque stolen"}]}, path=db)
+    assert [r["case_id"] for r in search("ram kumar", "cheque", path=db)] == ["c1"]
+    assert [r["case_id"] for r in search("ram", "cheq", path=db)] == ["c2"]
+    assert search("someone else", "cheque", path=db) == []
+
+def test_snippet_comes_from_the_matching_column(db):
+    message = {"role": "assistant", "content": "**Executive Summary** see the draft", "draft": {"text": "Legal notice for cheque bounce"}}
+    sync_user("asha", {"c1": [message]}, path=db)
+    assert search("asha", "cheque", path=db)[0]["snippet"] == "Legal notice for **cheque** bounce"
+
+def test_index_message_appends_in_order(db):
+    sync_user("asha", {"c1": [{"role": "user", "content": "bail hearing"}]}, path=db)
+    assert index_message("asha", "c1", 1, {"role": "assistant", "content": "anticipatory bail"}, path=db)
+    assert not index_message("asha", "c1", 5, {"role": "user", "content": "out of order"}, path=db)
+    assert len(search("asha", "bail", path=db)) == 2
+
+def test_old_layout_is_rebuilt(db):
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE VIRTUAL TABLE messages USING fts5(content, draft, user UNINDEXED, case_id UNINDEXED, msg_index UNINDEXED, role UNINDEXED)")
+    conn.execute("CREATE TABLE indexed (user TEXT, case_id TEXT, count INTEGER, PRIMARY KEY (user, case_id))")
+    conn.execute("INSERT INTO indexed VALUES ('asha', 'c1', 1)")
+    conn.commit()
+    conn.close()
+    sync_user("asha", {"c1": [{"role": "user", "content": "writ petition"}]}, path=db)
+    assert len(search("asha", "writ", path=db)) == 1
+
+def test_search_latency_with_many_users(db):
+    """One user's search must not pay for everyone else's messages in the shared DB."""
+    rng = random.Random(7)
+    for u in range(20):
+        chats = {f"case{c}": [{"role": "user", "content": " ".join(rng.choices(WORDS, k=30))} for _ in range(100)] for c in range(30)}
+        sync_user(f"user{u}", chats, path=db)
+
+    timings = []
+    for query in ["bail", "cheque dish", "murder section", "rent"]:
+        for _ in range(3):
+            start = time.perf_counter()
+            results = search("user3", query, path=db)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert results
+    assert statistics.median(timings) < 100
@@ -0,0 +1,32 @@
+import pytest
+from citation_index import parse_citations
+
+@pytest.mark.parametrize("query, expected", [
+    ("Section 138 of the NI Act", [("NI", "138")]),
+    ("S. 302 IPC", [("IPC", "302")]),
+    ("What is the punishment u/s 498A IPC?", [("IPC", "498A")]),
+    ("sec 66A of the IT Act", [("IT", "66A")]),
+    ("Section 103(1) BNS", [("BNS", "103")]),
+    ("Article 21 and the right to privacy", [("CONSTITUTION", "21")]),
+])
+def test_marked_citations(query, expected):
+    assert parse_citations(query) == expected
+
+@pytest.mark.parametrize("query, expected", [
+    ("302 IPC", [("IPC", "302")]),
+    ("302 IPC and 420 IPC", [("IPC", "302"), ("IPC", "420")]),
+    ("Section 302 and 307 IPC", [("IPC", "307")]),
+])
+def test_bare_numbers_count_when_the_query_is_only_citations(query, expected):
+    assert parse_citations(query) == expected
+
+@pytest.mark.parametrize("query", [
+    "give me 5 IPC offences",
+    "Explain 3 it act cases",
+    "list 10 bns sections on theft",
+])
+def test_bare_numbers_in_a_sentence_are_not_citations(query):
+    assert parse_citations(query) == []
+
+def test_duplicates_are_dropped_in_order_of_appearance():
+    assert parse_citations("Section 420 IPC vs section 302 IPC, and again section 420 IPC") == [("IPC", "420"), ("IPC", "302")]
@@ -0,0 +1,113 @@
+import time
+import threading
+import functools
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from crawler import Crawler, DomainLimiter, Frontier
+
+PDF = b"%PDF-1.4 fixture"
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serves the fixture site and records the peak number of requests in flight."""
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    delay_s = 0.0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(cls.delay_s)
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def handler():
+    """Fresh handler class per test, so request counters don't leak between tests."""
+    return type("SiteHandler", (QuietHandler,), {"lock": threading.Lock()})
+
+@pytest.fixture
+def site(tmp_path, handler):
+    """A local court-style site: a listing page, PDFs and robots.txt, served over HTTP."""
+    root = tmp_path / "site"
+    (root / "docs").mkdir(parents=True)
+    (root / "docs" / "a.pdf").write_bytes(PDF)
+    (root / "docs" / "b.pdf").write_bytes(PDF)
+    (root / "private").mkdir()
+    (root / "private" / "secret.pdf").write_bytes(PDF)
+    (root / "robots.txt").write_text("User-agent: *\nDisallow: /private\n")
+    (root / "index.html").write_text(
+        '<a href="docs/a.pdf">A</a> <a href="/private/secret.pdf">S</a> <a href="http://elsewhere.example/x.pdf">X</a>'
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+def make_crawler(tmp_path, seed, recrawl_after_h=20, limiter=None, **kwargs):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite3"), recrawl_after_h=recrawl_after_h)
+    return Crawler([seed], frontier=frontier, download_folder=str(tmp_path / "out"),
+                   limiter=limiter or DomainLimiter(delay=0), log=lambda message: None, **kwargs)
+
+def test_downloads_linked_pdfs_and_respects_robots(site, tmp_path):
+    _, base = site
+    downloaded = make_crawler(tmp_path, f"{base}/index.html").run()
+    assert downloaded == ["a.pdf"]
+    assert (tmp_path / "out" / "a.pdf").read_bytes() == PDF
+
+def test_listing_pages_are_recrawled_but_pdfs_are_not(site, tmp_path):
+    root, base = site
+    assert make_crawler(tmp_path, f"{base}/index.html").run() == ["a.pdf"]
+
+    # Same day: nothing is fetched again
+    assert make_crawler(tmp_path, f"{base}/index.html").run() == []
+
+    # Next harvest: the listing gained a judgment
+    (root / "index.html").write_text('<a href="docs/a.pdf">A</a> <a href="docs/b.pdf">B</a>')
+    assert make_crawler(tmp_path, f"{base}/index.html", recrawl_after_h=0).run() == ["b.pdf"]
+
+def test_resumes_in_progress_rows_after_a_crash(site, tmp_path):
+    _, base = site
+    frontier = Frontier(str(tmp_path / "frontier.sqlite3"))
+    frontier.add(f"{base}/docs/a.pdf", 1)
+    frontier.claim([])  # Claimed, then the process died
+    assert make_crawler(tmp_path, f"{base}/index.html").run() == ["a.pdf"]
+
+def test_daily_document_budget(site, tmp_path):
+    root, base = site
+    (root / "index.html").write_text('<a href="docs/a.pdf">A</a> <a href="docs/b.pdf">B</a>')
+    crawler = make_crawler(tmp_path, f"{base}/index.html", doc_budget=1)
+    assert len(crawler.run()) == 1
+    assert crawler.frontier.used_today()[1] == 1
+
+def test_fallback_fetcher_renders_listings_without_links(site, tmp_path):
+    root, base = site
+    (root / "index.html").write_text("<div id='app'></div><script>render()</script>")
+    rendered = []
+
+    def fallback(url):
+        rendered.append(url)
+        return '<a href="docs/b.pdf">B</a>'
+
+    assert make_crawler(tmp_path, f"{base}/index.html", fallback_fetcher=fallback).run() == ["b.pdf"]
+    assert rendered == [f"{base}/index.html"]
+
+def test_per_host_concurrency_cap(site, handler, tmp_path):
+    root, base = site
+    names = [f"doc{i}.pdf" for i in range(8)]
+    for name in names:
+        (root / "docs" / name).write_bytes(PDF)
+    (root / "index.html").write_text(" ".join(f'<a href="docs/{name}">{name}</a>' for name in names))
+    handler.delay_s = 0.1
+
+    crawler = make_crawler(tmp_path, f"{base}/index.html", limiter=DomainLimiter(concurrency=2, delay=0), workers=6)
+    assert sorted(crawler.run()) == names
+    assert handler.peak <= 2
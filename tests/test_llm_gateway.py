@@ -0,0 +1,88 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import llm_gateway
+from llm_gateway import FakeBackend, LLMGateway, TokenBucket
+
+UNLIMITED = {"requests_per_minute": 10**6, "tokens_per_minute": 10**9}
+
+class RateLimited(Exception):
+    status_code = 429
+
+class FlakyBackend(FakeBackend):
+    """Raises `error` for the first `failures` calls, then answers like FakeBackend."""
+
+    def __init__(self, error, failures):
+        super().__init__()
+        self.error = error
+        self.failures = failures
+
+    def invoke(self, prompt):
+        if self.calls < self.failures:
+            self.calls += 1
+            raise self.error
+        return super().invoke(prompt)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "backoff_delay", lambda attempt, error=None: 0)
+
+def test_retries_retryable_errors():
+    backend = FlakyBackend(RateLimited("429"), failures=2)
+    gateway = LLMGateway(backend, max_retries=4, **UNLIMITED)
+    message = gateway.invoke("hello")
+    assert message.content == "FAKE RESPONSE"
+    assert message.response_metadata["gateway"]["retries"] == 2
+    assert backend.calls == 3
+
+def test_gives_up_after_max_retries():
+    backend = FlakyBackend(TimeoutError("slow"), failures=10)
+    gateway = LLMGateway(backend, max_retries=2, **UNLIMITED)
+    with pytest.raises(TimeoutError):
+        gateway.invoke("hello")
+    assert backend.calls == 3
+
+def test_non_retryable_errors_pass_through():
+    backend = FlakyBackend(ValueError("bad prompt"), failures=1)
+    gateway = LLMGateway(backend, **UNLIMITED)
+    with gateway.user_context("asha"), pytest.raises(ValueError):
+        gateway.invoke("hello")
+    assert backend.calls == 1
+    assert gateway.usage_report()[0]["errors"] == 1
+
+def test_token_bucket_blocks_until_refilled():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 10 per second
+    bucket.acquire()
+    start = time.perf_counter()
+    bucket.acquire()
+    assert time.perf_counter() - start >= 0.08
+    assert not bucket.try_acquire()
+
+def test_queueing_for_a_slot_does_not_trigger_hedges():
+    backend = FakeBackend(latency_ms=200)
+    gateway = LLMGateway(backend, max_concurrency=4, hedge_after_ms=300, **UNLIMITED)
+    with ThreadPoolExecutor(16) as pool:
+        messages = list(pool.map(gateway.invoke, ["hello"] * 16))
+    assert not any(m.response_metadata["gateway"]["hedged"] for m in messages)
+    assert backend.calls == 16
+
+def test_slow_call_is_hedged_and_loser_is_billed():
+    lock = threading.Lock()
+    seen = []
+
+    class FirstCallSlow(FakeBackend):
+        def invoke(self, prompt):
+            with lock:
+                seen.append(prompt)
+                first = len(seen) == 1
+            if first:
+                time.sleep(0.3)
+            return super().invoke(prompt)
+
+    gateway = LLMGateway(FirstCallSlow(), max_concurrency=2, hedge_after_ms=50, **UNLIMITED)
+    with gateway.user_context("asha"):
+        message = gateway.invoke("hello")
+    assert message.response_metadata["gateway"]["hedged"]
+    time.sleep(0.4)  # Let the losing request finish
+    assert gateway.usage_report()[0]["hedge_tokens"] > 0